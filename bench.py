@@ -0,0 +1,163 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import instrumentation
+import mm
+import memm
+import stream
+try:
+	import resource
+except ImportError: # peak memory is only reported where the resource module exists
+	resource = None
+
+LENGTH_BUCKETS = [(1, 10), (11, 20), (21, 40), (41, None)] # the ranges of sentence lengths the latencies are reported for
+PERCENTILES = [50, 95, 99] # the percentiles of the latencies reported for each range of sentence lengths
+
+def parse_args():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("-f", "--file", nargs="+", default=["dev.tagged", "test.tagged"], help="the tagged files to be tagged")
+	parser.add_argument("-mm", "--mm", help="benchmarks the visible markov model at this path")
+	parser.add_argument("-memm", "--memm", help="benchmarks the maximum entropy markov model at this path")
+	parser.add_argument("-d", "--decoder", help="the decoder of the visible markov model, either lookahead, viterbi or beam")
+	parser.add_argument("-bw", "--beam-width", type=int, nargs="+", help="the beam widths of the beam decoder of the visible markov model, each benchmarked in turn")
+	parser.add_argument("-bt", "--batch", action="store_true", help="tags each file as one batch with the compiled visible markov model, so only the throughput is reported")
+	parser.add_argument("-in", "--instrument", action="store_true", help="instruments the models, adding the count and time of the calls of their methods to the results")
+	parser.add_argument("-r", "--repeats", type=int, default=1, help="the number of times each file is tagged")
+	parser.add_argument("-o", "--output", help="saves the JSON results to this path instead of printing them")
+	args = parser.parse_args()
+	if args.mm is None and args.memm is None:
+		print("you must select a model with -mm or -memm (see --help for help)")
+		return
+	if args.batch and args.memm:
+		print("only models for -mm can be tagged in batches (see --help for help)")
+		return
+	benchmarks = []
+	if args.mm:
+		options = {}
+		if args.decoder:
+			options["decoder"] = args.decoder
+		if args.beam_width:
+			for beam_width in args.beam_width:
+				benchmarks.append(("mm", args.mm, dict(options, decoder="beam", beam_width=beam_width)))
+		else:
+			benchmarks.append(("mm", args.mm, options))
+	if args.memm:
+		benchmarks.append(("memm", args.memm, {}))
+	results = {"commit": get_commit(), "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(), "repeats": args.repeats, "batch": args.batch, "instrument": args.instrument, "models": []}
+	context = multiprocessing.get_context("spawn") # a fresh process for each model, so its load time and peak memory are its own
+	for kind, model_path, options in benchmarks:
+		with context.Pool(1) as pool:
+			results["models"].append(pool.apply(benchmark_model, (kind, model_path, args.file, options, args.batch, args.repeats, args.instrument)))
+	results_string = json.dumps(results, indent="\t")
+	if args.output:
+		with open(args.output, "w") as results_file:
+			results_file.write("%s\n" % results_string)
+	else:
+		print(results_string)
+
+def get_commit(): # the commit the benchmark was run at, if it is run from a git checkout
+	try:
+		return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def get_peak_rss(): # the peak resident memory of this process in bytes
+	if resource is None:
+		return None
+	peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform != "darwin": # kilobytes everywhere but macOS
+		peak_rss *= 1024
+	return peak_rss
+
+def benchmark_model(kind, model_path, file_paths, options, batch, repeats, instrument=False):
+	model_instrumentation = None
+	if instrument:
+		model_instrumentation = instrumentation.Instrumentation()
+	peak_rss_before_load = get_peak_rss()
+	start = time.perf_counter()
+	if kind == "mm":
+		model = mm.MM(model_path=model_path, instrumentation=model_instrumentation)
+	else:
+		model = memm.MEMM(model_path=model_path, instrumentation=model_instrumentation)
+	load_seconds = time.perf_counter()-start
+	results = {"kind": kind, "model_path": model_path, "model_bytes": os.path.getsize(model_path), "options": options, "load_seconds": load_seconds, "files": {}}
+	for file_path in file_paths:
+		results["files"][file_path] = benchmark_file(model, file_path, options, batch, repeats)
+	results["table_sizes"] = model.get_table_sizes() # after tagging, which compiles the visible markov model for batches
+	if instrument:
+		results["instrumentation"] = model.get_instrumentation_stats()
+	results["peak_rss_before_load_bytes"] = peak_rss_before_load
+	results["peak_rss_bytes"] = get_peak_rss()
+	return results
+
+def benchmark_file(model, file_path, options, batch, repeats):
+	sentences, sentence_tags = read_tagged_sentences(file_path)
+	token_count = sum([len(sentence) for sentence in sentences])
+	latencies = [] # the length of each sentence tagged and the seconds it took
+	tag_predictions = []
+	start = time.perf_counter()
+	for _ in range(repeats):
+		if batch:
+			tag_predictions = model.get_pos_tags_batch(sentences, **options)
+		else:
+			tag_predictions = []
+			for sentence in sentences:
+				sentence_start = time.perf_counter()
+				tag_predictions.append(model.get_pos_tags(sentence, **options))
+				latencies.append((len(sentence), time.perf_counter()-sentence_start))
+	seconds = time.perf_counter()-start
+	correct = 0
+	for tags, predicted_tags in zip(sentence_tags, tag_predictions):
+		correct += sum([tag == predicted_tag for tag, predicted_tag in zip(tags, predicted_tags)])
+	results = {"sentences": len(sentences), "tokens": token_count, "seconds": seconds, "tokens_per_second": None, "accuracy": None, "latency": None}
+	if seconds > 0:
+		results["tokens_per_second"] = token_count*repeats/seconds
+	if token_count > 0:
+		results["accuracy"] = correct/token_count
+	if not batch:
+		results["latency"] = get_latency_percentiles(latencies)
+	return results
+
+def get_latency_percentiles(latencies): # the percentiles of the latencies in milliseconds for each range of sentence lengths
+	latency_percentiles = {}
+	for minimum, maximum in LENGTH_BUCKETS:
+		bucket = "%d+" % minimum
+		if maximum is not None:
+			bucket = "%d-%d" % (minimum, maximum)
+		bucket_latencies = [seconds*1000 for length, seconds in latencies if length >= minimum and (maximum is None or length <= maximum)]
+		latency_percentiles[bucket] = {"sentences": len(bucket_latencies)}
+		for percentile in PERCENTILES:
+			latency_percentiles[bucket]["p%d_ms" % percentile] = None
+			if len(bucket_latencies) > 0:
+				latency_percentiles[bucket]["p%d_ms" % percentile] = float(np.percentile(bucket_latencies, percentile))
+	return latency_percentiles
+
+def read_tagged_sentences(file_path): # the tokens and the tags of each sentence of a tagged file
+	sentences = []
+	sentence_tags = []
+	sentence = []
+	tags = []
+	with open(file_path) as data:
+		for line in data:
+			if stream.is_token_line(line):
+				token_and_tag = line.split("\t")
+				sentence.append(token_and_tag[0].strip())
+				tags.append(token_and_tag[1].strip())
+			elif len(sentence) > 0:
+				sentences.append(sentence)
+				sentence_tags.append(tags)
+				sentence = []
+				tags = []
+	if len(sentence) > 0: # handle last sentence if data file does not end in new line
+		sentences.append(sentence)
+		sentence_tags.append(tags)
+	return sentences, sentence_tags
+
+if __name__ == "__main__": # the worker processes import this module without running it
+	parse_args()
@@ -0,0 +1,92 @@
+import json
+import mmap
+import zlib
+import numpy as np
+
+MAGIC = b"AKPOSBIN" # the first bytes of every binary model file
+VERSION = 1 # the newest binary model format version that can be read and the version that is written
+ALIGNMENT = 64 # the byte alignment of every array in the file
+
+# a binary model file is laid out as:
+#   MAGIC, then the version and the header length as little-endian 32 bit unsigned integers
+#   the header, a JSON object with the kind of model, its plain values and the dtype, shape and offset of each array
+#   the arrays, each starting on an ALIGNMENT byte boundary so they can be used in place from a memory map
+
+def is_binary_model(model_path):
+	with open(model_path, "rb") as model:
+		return model.read(len(MAGIC)) == MAGIC
+
+def encode_strings(strings): # a string table is the strings joined by new lines, since no token or tag can contain one
+	return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+def decode_strings(string_table, count):
+	if count == 0:
+		return []
+	return bytes(string_table).decode("utf-8").split("\n")
+
+def pack_arrays(arrays): # packs arrays that are not used in place into one compressed byte array, returning the header needed to unpack them and the bytes
+	header = {}
+	chunks = []
+	offset = 0
+	for name in arrays:
+		array = np.ascontiguousarray(arrays[name])
+		array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+		header[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+		chunks.append(array.tobytes())
+		offset += array.nbytes
+	return header, np.frombuffer(zlib.compress(b"".join(chunks)), dtype=np.uint8)
+
+def unpack_arrays(header, packed_arrays):
+	data = zlib.decompress(packed_arrays.tobytes())
+	arrays = {}
+	for name in header:
+		dtype = np.dtype(header[name]["dtype"])
+		count = int(np.prod(header[name]["shape"], dtype=np.int64))
+		arrays[name] = np.frombuffer(data, dtype=dtype, count=count, offset=header[name]["offset"]).reshape(header[name]["shape"])
+	return arrays
+
+def get_index_dtype(maximum): # the smallest unsigned integer type holding every value up to the maximum
+	return np.min_scalar_type(max(int(maximum), 0))
+
+def write_binary_model(save_path, kind, values, arrays):
+	header = {"kind": kind, "values": values, "arrays": {}}
+	offset = 0
+	for name in arrays:
+		array = np.ascontiguousarray(arrays[name])
+		array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+		arrays[name] = array
+		offset = (offset+ALIGNMENT-1)//ALIGNMENT*ALIGNMENT
+		header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+		offset += array.nbytes
+	header_bytes = json.dumps(header).encode("utf-8")
+	data_start = (len(MAGIC)+8+len(header_bytes)+ALIGNMENT-1)//ALIGNMENT*ALIGNMENT
+	with open(save_path, "wb") as model_file:
+		model_file.write(MAGIC)
+		model_file.write(np.array([VERSION, len(header_bytes)], dtype="<u4").tobytes())
+		model_file.write(header_bytes)
+		for name in arrays:
+			model_file.write(b"\0" * (data_start+header["arrays"][name]["offset"]-model_file.tell()))
+			model_file.write(arrays[name].tobytes())
+
+def read_binary_model(model_path, kind): # returns the plain values and the arrays of a binary model, with the arrays backed by a read-only memory map
+	with open(model_path, "rb") as model_file:
+		if model_file.read(len(MAGIC)) != MAGIC:
+			raise ValueError("%s is not a binary model" % model_path)
+		version, header_length = np.frombuffer(model_file.read(8), dtype="<u4")
+		if version > VERSION:
+			raise ValueError("%s uses binary model version %d, but only versions up to %d are supported" % (model_path, version, VERSION))
+		header = json.loads(model_file.read(int(header_length)).decode("utf-8"))
+		if header["kind"] != kind:
+			raise ValueError("%s is a binary %s model, not a binary %s model" % (model_path, header["kind"], kind))
+		data_start = (len(MAGIC)+8+int(header_length)+ALIGNMENT-1)//ALIGNMENT*ALIGNMENT
+		model_map = mmap.mmap(model_file.fileno(), 0, access=mmap.ACCESS_READ) # the pages are shared by every process that maps the same file
+	arrays = {}
+	for name in header["arrays"]:
+		array_header = header["arrays"][name]
+		dtype = np.dtype(array_header["dtype"])
+		count = int(np.prod(array_header["shape"], dtype=np.int64))
+		if count == 0:
+			arrays[name] = np.zeros(array_header["shape"], dtype=dtype)
+		else:
+			arrays[name] = np.frombuffer(model_map, dtype=dtype, count=count, offset=data_start+array_header["offset"]).reshape(array_header["shape"])
+	return header["values"], arrays
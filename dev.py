@@ -1,8 +1,15 @@
 import argparse
+import json
+import sys
+import binary_model
+import evaluation
 import mm
 import memm
+import parallel
+import stream
+import sweep
 
-def parse_args():
+def main():
 	parser = argparse.ArgumentParser()
 	parser.add_argument("-f", "--file", help="the input file to be analyzed")
 	parser.add_argument("-tr", "--train", action="store_true", help="trains the learning algorithm")
@@ -10,14 +17,89 @@ def parse_args():
 	parser.add_argument("-tu", "--tune", action="store_true", help="tunes the learning algorithm")
 	parser.add_argument("-m", "--model", help="the pre-trained model to be used for testing")
 	parser.add_argument("-s", "--save", action="store_true", help="save the model after training")
+	parser.add_argument("-b", "--binary", action="store_true", help="save the model in the binary format")
+	parser.add_argument("-st", "--stream", action="store_true", help="trains in one pass with bounded memory, spilling counts or training data to disk")
+	parser.add_argument("-sh", "--shard", action="store_true", help="saves the unpruned counts of the visible markov model as a shard to be merged with -mg, instead of training")
+	parser.add_argument("-mg", "--merge", nargs="+", help="merges the shards of the visible markov model saved with -sh, in the order of their data, and saves the model")
+	parser.add_argument("-tg", "--tag", action="store_true", help="tags the lines of tokens of the file, or of standard input without -f, with the pre-trained model of -mm or -memm selected by -m, writing each line with its predicted tag added as a last column to standard output")
+	parser.add_argument("-cv", "--convert", help="converts the pre-trained model of -mm or -memm selected by -m between the text and binary formats, saving it to this path")
+	parser.add_argument("-sw", "--sweep", help="sweeps the configurations of the learning algorithm in this JSON search space, such as {\"minimum\": [2, 3, 5], \"to_lowercase\": [false, true]}, training and testing each on every fold of the file in a pool of processes")
+	parser.add_argument("-fo", "--folds", type=int, default=sweep.DEFAULT_FOLDS, help="the number of folds the sentences of the file are split into for a sweep")
+	parser.add_argument("-sa", "--samples", type=int, help="sweeps this many configurations picked at random from the search space instead of all of them")
+	parser.add_argument("-o", "--output", help="saves the JSON leaderboard of a sweep to this path instead of printing it")
 	parser.add_argument("-min", "--minimum", type=int, help="tunes the minimum number of token occurrences to be considered by the model")
 	parser.add_argument("-low", "--lowercase", action="store_true", help="tunes whether or not to convert all tokens to their lowercase form for the model")
 	parser.add_argument("-e", "--epochs", type=int, help="tunes the maximum number of epochs to be used in training the maximum entropy markov model perceptron")
 	parser.add_argument("-fe", "--features", type=int, help="tunes the minimum number of feature occurrences to be considered by the maximum entropy markov model")
+	parser.add_argument("-avg", "--averaged", action="store_true", help="trains the maximum entropy markov model perceptrons with averaged weights")
+	parser.add_argument("-ho", "--held-out", type=float, help="the fraction of the training data held out to stop each maximum entropy markov model perceptron early")
 	parser.add_argument("-mm", "--mm", action="store_true", help="run using visible markov model")
 	parser.add_argument("-memm", "--memm", action="store_true", help="run using maximum entropy markov model with features as unigrams in a +/- 2 unigram window of tokens")
+	parser.add_argument("-p", "--processes", type=int, help="the number of processes to train or to tag with when testing")
 	args = parser.parse_args()
-	if args.file:
+	if args.merge:
+		m1 = mm.MM(model_path=None)
+		for shard_path in args.merge:
+			m1.merge_counts(mm.MM(model_path=shard_path))
+		minimum = m1.DEFAULT_MIN_TOKEN_OCCURRENCES
+		if args.minimum:
+			minimum = args.minimum
+		m1.prune(minimum)
+		if args.binary:
+			m1.save_model("m1-data.bin", binary=True)
+		else:
+			m1.save_model("m1-data.txt")
+	elif args.convert:
+		if args.model is None:
+			print("you must select a pre-trained model to be converted using the argument -m (see --help for help)")
+		elif args.mm:
+			m1 = mm.MM(model_path=args.model)
+			m1.save_model(args.convert, binary=not binary_model.is_binary_model(args.model))
+		elif args.memm:
+			m2 = memm.MEMM(model_path=args.model)
+			m2.save_model(args.convert, binary=not binary_model.is_binary_model(args.model))
+		else:
+			print("you must select an argument -mm or -memm (see --help for help)")
+	elif args.tag:
+		if args.model is None:
+			print("you must select a pre-trained model to tag with using the argument -m (see --help for help)")
+		elif args.mm or args.memm:
+			if args.mm:
+				model = mm.MM(model_path=args.model)
+			else:
+				model = memm.MEMM(model_path=args.model)
+			data = sys.stdin
+			if args.file:
+				data = open(args.file)
+			with data:
+				if args.processes:
+					with parallel.ParallelTagger(model, processes=args.processes) as tagger:
+						stream.write_tagged(tagger, data)
+				else:
+					stream.write_tagged(model, data)
+		else:
+			print("you must select an argument -mm or -memm (see --help for help)")
+	elif args.sweep:
+		if args.file is None:
+			print("you must select a file to be swept using the argument -f (see --help for help)")
+		elif args.mm is False and args.memm is False:
+			print("you must select an argument -mm or -memm (see --help for help)")
+		else:
+			try:
+				with open(args.file) as data:
+					model_sweep = sweep.Sweep("mm" if args.mm else "memm", data, folds=args.folds)
+				leaderboard = model_sweep.run(json.loads(args.sweep), processes=args.processes, samples=args.samples)
+			except ValueError as error:
+				print("%s (see --help for help)" % error)
+				return
+			leaderboard["file"] = args.file
+			leaderboard_string = json.dumps(leaderboard, indent="\t")
+			if args.output:
+				with open(args.output, "w") as leaderboard_file:
+					leaderboard_file.write("%s\n" % leaderboard_string)
+			else:
+				print(leaderboard_string)
+	elif args.file:
 		if args.train is False and args.test is False and args.tune is False:
 			print("you must select an argument -tr, -te, or -tu (see --help for help)")
 		elif args.mm is False and args.memm is False:
@@ -26,29 +108,51 @@ def parse_args():
 			if args.mm:
 				m1 = mm.MM(model_path=None)
 				with open(args.file) as data:
-					m1.set_model(data)
+					if args.shard:
+						m1.set_counts(data)
+						m1.save_model("%s.shard%s" % (args.file, ".bin" if args.binary else ".txt"), binary=args.binary)
+						return
+					if args.stream:
+						m1.set_model_streaming(data)
+					elif args.processes:
+						m1 = parallel.train_mm(data, processes=args.processes)
+					else:
+						m1.set_model(data)
 					if args.save:
-						m1.save_model("m1-data.txt")
+						if args.binary:
+							m1.save_model("m1-data.bin", binary=True)
+						else:
+							m1.save_model("m1-data.txt")
 					data.seek(0)
-					test_accuracy_mm(m1, data, to_lowercase=m1.DEFAULT_TO_LOWERCASE)
+					test_accuracy(m1, data, to_lowercase=m1.DEFAULT_TO_LOWERCASE)
 			elif args.memm:
 				m2 = memm.MEMM(model_path=None)
+				held_out_fraction = 0.0
+				if args.held_out:
+					held_out_fraction = args.held_out
 				with open(args.file) as data:
-					m2.set_model(data)
+					if args.stream:
+						m2.set_model_streaming(data, processes=args.processes, averaged=args.averaged, held_out_fraction=held_out_fraction)
+					else:
+						m2.set_model(data, processes=args.processes, averaged=args.averaged, held_out_fraction=held_out_fraction)
+					print_training_report(m2)
 					if args.save:
-						m2.save_model("m2-data.txt")
+						if args.binary:
+							m2.save_model("m2-data.bin", binary=True)
+						else:
+							m2.save_model("m2-data.txt")
 					data.seek(0)
-					test_accuracy_memm(m2, data, to_lowercase=m2.DEFAULT_TO_LOWERCASE)
+					test_accuracy(m2, data, to_lowercase=m2.DEFAULT_TO_LOWERCASE)
 		elif args.train is False and args.test and args.tune is False: # test the input
 			if args.model:
 				if args.mm:
 					m1 = mm.MM(model_path=args.model)
 					with open(args.file) as data:
-						test_accuracy_mm(m1, data, to_lowercase=m1.DEFAULT_TO_LOWERCASE)
+						test_accuracy(m1, data, to_lowercase=m1.DEFAULT_TO_LOWERCASE, processes=args.processes)
 				elif args.memm:
 					m2 = memm.MEMM(model_path=args.model)
 					with open(args.file) as data:
-						test_accuracy_memm(m2, data, to_lowercase=m2.DEFAULT_TO_LOWERCASE)
+						test_accuracy(m2, data, to_lowercase=m2.DEFAULT_TO_LOWERCASE, processes=args.processes)
 			else:
 				print("you must select a pre-trained model to be tested using the argument -m (see --help for help)")
 		elif args.train is False and args.test is False and args.tune: # tune the input
@@ -66,7 +170,7 @@ def parse_args():
 							to_lowercase = True
 						m1.set_model(data, minimum=minimum, to_lowercase=to_lowercase)
 						data.seek(0)
-						test_accuracy_mm(m1, data, to_lowercase=m1.DEFAULT_TO_LOWERCASE)
+						test_accuracy(m1, data, to_lowercase=m1.DEFAULT_TO_LOWERCASE)
 				elif args.memm:
 					m2 = memm.MEMM(model_path=None)
 					minimum = m2.DEFAULT_MIN_TOKEN_OCCURRENCES
@@ -84,102 +188,42 @@ def parse_args():
 						minimum_for_feature = m2.DEFAULT_MIN_FEATURE_OCCURRENCES
 						if args.features > 0:
 							minimum_for_feature = args.features
-						m2.set_model(data, minimum_for_token=minimum, minimum_for_feature=minimum_for_feature, to_lowercase=to_lowercase, max_epochs=max_epochs)
+						held_out_fraction = 0.0
+						if args.held_out:
+							held_out_fraction = args.held_out
+						m2.set_model(data, minimum_for_token=minimum, minimum_for_feature=minimum_for_feature, to_lowercase=to_lowercase, max_epochs=max_epochs, averaged=args.averaged, held_out_fraction=held_out_fraction)
+						print_training_report(m2)
 						data.seek(0)
-						test_accuracy_memm(m2, data, to_lowercase=m2.DEFAULT_TO_LOWERCASE)
+						test_accuracy(m2, data, to_lowercase=m2.DEFAULT_TO_LOWERCASE)
 		else:
 			print("you must select only one argument -tr, -te, or -tu (see --help for help)")
 	else:
 		print("you must select a file to be analyzed using the argument -f (see --help for help)")
 
-def test_accuracy_mm(model, data, to_lowercase):
-	tag_predictions = []
-	sentence = [] # model analyzes one sentence at a time
-	# get tag predictions first
-	for line in data:
-		if "\t" in line and len(line) > 2:
-			token_and_tag = line.split("\t")
-			token = token_and_tag[0].strip()
-			if to_lowercase:
-				token = token.lower()
-			sentence.append(token)
+def print_training_report(model):
+	for epoch in model.training_report:
+		if epoch["held_out_accuracy"] is None:
+			print("Epoch %d: %.2fs, %d perceptrons training" % (epoch["epoch"], epoch["seconds"], epoch["tokens"]))
 		else:
-			tag_predictions.extend(model.get_pos_tags(sentence, to_lowercase=to_lowercase))
-			sentence = [] # reset sentence
-	if len(sentence) > 0: # handle last sentence if data file does not end in new line
-		tag_predictions.extend(model.get_pos_tags(sentence, to_lowercase=to_lowercase))
-	data.seek(0)
-	overall_correct = 0 # track correct predictions during testing
-	overall_incorrect = 0 # track incorrect predictions during testing
-	unknown_correct = 0 # track correct predictions for unknown tokens during testing
-	unknown_incorrect = 0 # track incorrect predictions for unknown tokens during testing
-	# analyze the predictions to determine how many correct vs. incorrect
-	i = 0
-	for line in data:
-		if "\t" in line and len(line) > 2:
-			token_and_tag = line.split("\t")
-			token = token_and_tag[0].strip()
-			if to_lowercase:
-				token = token.lower()
-			actual_tag = token_and_tag[1].strip()
-			predicted_tag = tag_predictions[i]
-			if actual_tag == predicted_tag:
-				overall_correct += 1
-				if token not in model.token_as_tag_likelihood:
-					unknown_correct += 1
-			else:
-				overall_incorrect += 1
-				if token not in model.token_as_tag_likelihood:
-					unknown_incorrect += 1
-			i += 1
-	print("Overall correct: %d (%.3f)" % (overall_correct, float(overall_correct/(overall_incorrect+overall_correct))))
-	print("Overall incorrect: %d (%.3f)" % (overall_incorrect, float(overall_incorrect/(overall_incorrect+overall_correct))))
-	print("Unknown correct: %d (%.3f)" % (unknown_correct, float(unknown_correct/(unknown_incorrect+unknown_correct))))
-	print("Unknown incorrect: %d (%.3f)" % (unknown_incorrect, float(unknown_incorrect/(unknown_incorrect+unknown_correct))))
+			print("Epoch %d: %.2fs, %d perceptrons training, held-out accuracy %.3f" % (epoch["epoch"], epoch["seconds"], epoch["tokens"], epoch["held_out_accuracy"]))
 
-def test_accuracy_memm(model, data, to_lowercase):
-	tag_predictions = []
-	sentence = [] # model analyzes one sentence at a time
-	# get tag predictions first
-	for line in data:
-		if "\t" in line and len(line) > 2:
-			token_and_tag = line.split("\t")
-			token = token_and_tag[0].strip()
-			if to_lowercase:
-				token = token.lower()
-			sentence.append(token)
-		else:
-			tag_predictions.extend(model.get_pos_tags(sentence, to_lowercase=to_lowercase))
-			sentence = [] # reset sentence
-	if len(sentence) > 0: # handle last sentence if data file does not end in new line
-		tag_predictions.extend(model.get_pos_tags(sentence, to_lowercase=to_lowercase))
-	data.seek(0)
-	overall_correct = 0 # track correct predictions during testing
-	overall_incorrect = 0 # track incorrect predictions during testing
-	unknown_correct = 0 # track correct predictions for unknown tokens during testing
-	unknown_incorrect = 0 # track incorrect predictions for unknown tokens during testing
-	# analyze the predictions to determine how many correct vs. incorrect
-	i = 0
-	for line in data:
-		if "\t" in line and len(line) > 2:
-			token_and_tag = line.split("\t")
-			token = token_and_tag[0].strip()
-			if to_lowercase:
-				token = token.lower()
-			actual_tag = token_and_tag[1].strip()
-			predicted_tag = tag_predictions[i]
-			if actual_tag == predicted_tag:
-				overall_correct += 1
-				if token not in model.token_dictionary:
-					unknown_correct += 1
-			else:
-				overall_incorrect += 1
-				if token not in model.token_dictionary:
-					unknown_incorrect += 1
-			i += 1
-	print("Overall correct: %d (%.3f)" % (overall_correct, float(overall_correct/(overall_incorrect+overall_correct))))
-	print("Overall incorrect: %d (%.3f)" % (overall_incorrect, float(overall_incorrect/(overall_incorrect+overall_correct))))
-	print("Unknown correct: %d (%.3f)" % (unknown_correct, float(unknown_correct/(unknown_incorrect+unknown_correct))))
-	print("Unknown incorrect: %d (%.3f)" % (unknown_incorrect, float(unknown_incorrect/(unknown_incorrect+unknown_correct))))
+def test_accuracy(model, data, to_lowercase, processes=None):
+	stats = evaluation.evaluate(model, data, to_lowercase=to_lowercase, processes=processes).get_stats()
+	for name, label in [("overall", "Overall"), ("unknown", "Unknown"), ("known", "Known")]:
+		for outcome in ["correct", "incorrect"]:
+			fraction = 0.0
+			if stats[name]["accuracy"] is not None:
+				fraction = stats[name][outcome]/(stats[name]["correct"]+stats[name]["incorrect"])
+			print("%s %s: %d (%.3f)" % (label, outcome, stats[name][outcome], fraction))
+	print("Tag\tPrecision\tRecall\tActual\tPredicted")
+	for tag in stats["tags"]:
+		tag_stats = stats["tags"][tag]
+		print("%s\t%s\t%s\t%d\t%d" % (tag, format_fraction(tag_stats["precision"]), format_fraction(tag_stats["recall"]), tag_stats["actual"], tag_stats["predicted"]))
+
+def format_fraction(fraction):
+	if fraction is None:
+		return "-"
+	return "%.3f" % fraction
 
-parse_args()
\ No newline at end of file
+if __name__ == "__main__": # the worker processes of the spawn and forkserver start methods import this module without running it
+	main()
@@ -0,0 +1,117 @@
+import collections
+import numpy as np
+import parallel
+import stream
+
+DEFAULT_SHARD_SIZE = 256 # the default number of sentences tagged and scored at a time
+
+class Evaluation: # the correct and incorrect tags of known and unknown tokens, and the confusion matrix of the actual and predicted tags
+
+	def __init__(self):
+		self.tags = [] # the tag of each row and column of the confusion matrix, in the order they were first seen
+		self.tag_ids = {}
+		self.confusion = np.zeros((0, 0), dtype=np.int64) # the number of times each actual tag (row) was predicted as each tag (column)
+		self.known_correct = 0
+		self.known_incorrect = 0
+		self.unknown_correct = 0
+		self.unknown_incorrect = 0
+
+	def get_tag_ids(self, tags): # the ids of the tags, growing the confusion matrix for tags not seen before
+		for tag in tags:
+			if tag not in self.tag_ids:
+				self.tag_ids[tag] = len(self.tags)
+				self.tags.append(tag)
+		if len(self.tags) > len(self.confusion):
+			self.confusion = np.pad(self.confusion, (0, len(self.tags)-len(self.confusion)))
+		return np.array([self.tag_ids[tag] for tag in tags], dtype=np.int64)
+
+	def add_sentences(self, sentence_tags, sentence_predictions, sentence_unknown_tokens):
+		actual_tags = []
+		predicted_tags = []
+		for tags, tag_predictions, unknown_tokens in zip(sentence_tags, sentence_predictions, sentence_unknown_tokens):
+			for actual_tag, predicted_tag, is_unknown in zip(tags, tag_predictions, unknown_tokens):
+				if actual_tag == predicted_tag:
+					if is_unknown:
+						self.unknown_correct += 1
+					else:
+						self.known_correct += 1
+				elif is_unknown:
+					self.unknown_incorrect += 1
+				else:
+					self.known_incorrect += 1
+			actual_tags.extend(tags)
+			predicted_tags.extend(tag_predictions)
+		actual_tag_ids = self.get_tag_ids(actual_tags)
+		predicted_tag_ids = self.get_tag_ids(predicted_tags)
+		np.add.at(self.confusion, (actual_tag_ids, predicted_tag_ids), 1)
+
+	def merge(self, evaluation): # adds the counts of an evaluation of other sentences
+		tag_ids = self.get_tag_ids(evaluation.tags)
+		self.confusion[np.ix_(tag_ids, tag_ids)] += evaluation.confusion
+		self.known_correct += evaluation.known_correct
+		self.known_incorrect += evaluation.known_incorrect
+		self.unknown_correct += evaluation.unknown_correct
+		self.unknown_incorrect += evaluation.unknown_incorrect
+
+	def get_stats(self): # the accuracy of all, known and unknown tokens, and the precision and recall of each tag, most frequent first
+		stats = {"overall": get_accuracy(self.known_correct+self.unknown_correct, self.known_incorrect+self.unknown_incorrect), "known": get_accuracy(self.known_correct, self.known_incorrect), "unknown": get_accuracy(self.unknown_correct, self.unknown_incorrect), "tags": {}}
+		correct = np.diagonal(self.confusion)
+		actual = self.confusion.sum(axis=1)
+		predicted = self.confusion.sum(axis=0)
+		for i in sorted(range(len(self.tags)), key=lambda i: (-actual[i], self.tags[i])):
+			stats["tags"][self.tags[i]] = {"actual": int(actual[i]), "predicted": int(predicted[i]), "correct": int(correct[i]), "precision": get_fraction(correct[i], predicted[i]), "recall": get_fraction(correct[i], actual[i])}
+		return stats
+
+def get_fraction(count, total):
+	if total == 0:
+		return None
+	return float(count/total)
+
+def get_accuracy(correct, incorrect):
+	return {"correct": int(correct), "incorrect": int(incorrect), "accuracy": get_fraction(correct, correct+incorrect)}
+
+def evaluate(model, data, to_lowercase=None, processes=None, shard_size=DEFAULT_SHARD_SIZE):
+	# tags and scores the tagged sentences of the data in a single pass, a shard of sentences at a time. with processes, the
+	# shards are tagged and scored in that many worker processes sharing the model, and only their counts are sent back
+	if to_lowercase is None:
+		to_lowercase = model.DEFAULT_TO_LOWERCASE
+	evaluation = Evaluation()
+	shards = get_shards(stream.read_sentences(data, tagged=True), shard_size)
+	if processes is None:
+		for shard in shards:
+			score_sentences(model, shard, to_lowercase, evaluation)
+		return evaluation
+	if hasattr(model, "compile") and model.compiled_model is None:
+		model.compile() # compile once in the parent so every worker shares the same arrays
+	with parallel.start_pool(model, processes) as pool:
+		results = collections.deque() # the shards sent to the workers and not yet merged, so the data is never read far ahead
+		for shard in shards:
+			results.append(pool.apply_async(evaluate_shard, ((shard, to_lowercase),)))
+			if len(results) >= processes*parallel.TASKS_PER_PROCESS:
+				evaluation.merge(results.popleft().get())
+		while len(results) > 0:
+			evaluation.merge(results.popleft().get())
+	return evaluation
+
+def get_shards(sentences, shard_size):
+	shard = []
+	for rows in sentences:
+		shard.append(rows)
+		if len(shard) >= shard_size:
+			yield shard
+			shard = []
+	if len(shard) > 0:
+		yield shard
+
+def evaluate_shard(task):
+	shard, to_lowercase = task
+	evaluation = Evaluation()
+	score_sentences(parallel.worker_model, shard, to_lowercase, evaluation)
+	return evaluation
+
+def score_sentences(model, shard, to_lowercase, evaluation):
+	sentences = [[columns[0].strip() for columns in rows] for rows in shard]
+	sentence_tags = [[columns[1].strip() if len(columns) > 1 else "" for columns in rows] for rows in shard]
+	sentence_predictions = parallel.tag_sentences(model, sentences, to_lowercase, {})
+	sentence_unknown_tokens = [model.find_unknown_tokens(sentence, to_lowercase=to_lowercase) for sentence in sentences]
+	evaluation.add_sentences(sentence_tags, sentence_predictions, sentence_unknown_tokens)
@@ -0,0 +1,104 @@
+import inspect
+import threading
+import time
+
+class Instrumentation: # counts and times the calls of the methods of a model, and passes a record of each tagging call to a callback
+
+	def __init__(self, callback=None):
+		self.callback = callback # called with the record of every tagging call, on the thread that made it
+		self.lock = threading.Lock()
+		self.local = threading.local() # the record of the tagging call in progress on each thread
+		self.clear()
+
+	def __getstate__(self): # a copy sent to another process starts from zero without the callback, since a lock cannot be sent
+		return {}
+
+	def __setstate__(self, state):
+		self.__init__()
+
+	def clear(self):
+		with self.lock:
+			self.calls = {} # the number of calls, the total seconds and the seconds of the slowest call of each method
+			self.sentences = 0
+			self.tokens = 0
+			self.unknown_tokens = 0
+
+	def instrument(self, model, tagging_methods, methods):
+		# the methods are replaced on the model object itself, so a model without instrumentation runs its methods unchanged
+		for name in tagging_methods:
+			setattr(model, name, InstrumentedMethod(self, model, name, is_tagging=True))
+		for name in methods:
+			setattr(model, name, InstrumentedMethod(self, model, name))
+
+	def add_call(self, name, seconds):
+		with self.lock:
+			if name not in self.calls:
+				self.calls[name] = {"count": 0, "seconds": 0.0, "max_seconds": 0.0}
+			self.calls[name]["count"] += 1
+			self.calls[name]["seconds"] += seconds
+			self.calls[name]["max_seconds"] = max(self.calls[name]["max_seconds"], seconds)
+		record = getattr(self.local, "record", None)
+		if record is not None:
+			record["calls"][name] = record["calls"].get(name, 0)+1
+
+	def start_record(self, name): # returns the record of a new tagging call, or None if the thread is already in one
+		if getattr(self.local, "record", None) is not None:
+			return None
+		self.local.record = {"method": name, "sentences": 0, "tokens": 0, "unknown_tokens": 0, "seconds": 0.0, "calls": {}}
+		return self.local.record
+
+	def end_record(self, record, sentence_count, token_count, unknown_token_count, seconds):
+		self.local.record = None
+		record["sentences"] = sentence_count
+		record["tokens"] = token_count
+		record["unknown_tokens"] = unknown_token_count
+		record["seconds"] = seconds
+		with self.lock:
+			self.sentences += sentence_count
+			self.tokens += token_count
+			self.unknown_tokens += unknown_token_count
+		if self.callback is not None:
+			self.callback(record)
+
+	def get_stats(self): # a snapshot of every count and time so far
+		with self.lock:
+			return {"sentences": self.sentences, "tokens": self.tokens, "unknown_tokens": self.unknown_tokens, "calls": {name: dict(self.calls[name]) for name in self.calls}}
+
+class InstrumentedMethod: # a method of a model that times its calls, and for a tagging method also records the sentences it tags
+
+	def __init__(self, instrumentation, model, name, is_tagging=False):
+		self.instrumentation = instrumentation
+		self.model = model
+		self.name = name
+		self.function = getattr(type(model), name) # the plain function, which can be sent to another process by name
+		self.is_tagging = is_tagging
+		self.signature = inspect.signature(self.function)
+		self.sentences_parameter = list(self.signature.parameters)[1] # "sentence" for a tagging method, or "sentences" for a batch
+
+	def __call__(self, *args, **kwargs):
+		record = None
+		if self.is_tagging:
+			record = self.instrumentation.start_record(self.name)
+		if record is None: # not a tagging method, or called from within one
+			start = time.perf_counter()
+			result = self.function(self.model, *args, **kwargs)
+			self.instrumentation.add_call(self.name, time.perf_counter()-start)
+			return result
+		try:
+			arguments = self.signature.bind(self.model, *args, **kwargs)
+			arguments.apply_defaults()
+			sentences = [arguments.arguments[self.sentences_parameter]]
+			if self.sentences_parameter == "sentences":
+				sentences = list(arguments.arguments["sentences"]) # the sentences are counted after they are tagged
+				arguments.arguments["sentences"] = sentences
+			start = time.perf_counter()
+			result = self.function(*arguments.args, **arguments.kwargs)
+			seconds = time.perf_counter()-start
+		except BaseException:
+			self.instrumentation.local.record = None
+			raise
+		self.instrumentation.add_call(self.name, seconds)
+		to_lowercase = arguments.arguments.get("to_lowercase", self.model.DEFAULT_TO_LOWERCASE)
+		unknown_token_count = sum([self.model.count_unknown_tokens(sentence, to_lowercase=to_lowercase) for sentence in sentences])
+		self.instrumentation.end_record(record, len(sentences), sum([len(sentence) for sentence in sentences]), unknown_token_count, seconds)
+		return result
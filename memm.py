@@ -1,4 +1,11 @@
+import os
 import random
+import tempfile
+import time
+import numpy as np
+import binary_model
+import parallel
+import stream
 
 class MEMM:
 
@@ -7,19 +14,41 @@ class MEMM:
 	DEFAULT_MIN_FEATURE_OCCURRENCES = 30 # the default minimum amount of occurrences for a feature to appear to be considered by the model
 	DEFAULT_TO_LOWERCASE = True # the default of whether or not to convert all tokens to their lowercase form for the model
 	DEFAULT_MAX_EPOCHS = 10 # the default number of epochs for training the perceptron
+	DEFAULT_SEED = 0 # the default seed of the random shuffling of the data of each token's perceptron
+	DEFAULT_CHUNK_SIZE = 100000 # the default number of lines or window vectors read at a time while training from a stream
+	DEFAULT_PATIENCE = 1 # the default number of epochs without a better held-out accuracy before a perceptron stops early
+	INSTRUMENTED_TAGGING_METHODS = ["get_pos_tags"] # the methods that tag sentences, each call of which is recorded when instrumented
+	INSTRUMENTED_METHODS = ["get_window_feature_ids", "get_similarity_scores"] # the methods counted and timed when instrumented
 
-	def __init__(self, model_path=DEFAULT_MODEL_PATH):
+	def __init__(self, model_path=DEFAULT_MODEL_PATH, instrumentation=None):
+		self.instrumentation = instrumentation # counts and times the tagging of every sentence, if given
+		if self.instrumentation is not None:
+			self.instrumentation.instrument(self, self.INSTRUMENTED_TAGGING_METHODS, self.INSTRUMENTED_METHODS)
 		self.reset_vars()
 		if model_path is not None:
-			with open(model_path) as model:
-				self.load_model(model)
+			if binary_model.is_binary_model(model_path):
+				self.load_binary_model(model_path)
+			else:
+				with open(model_path) as model:
+					self.load_model(model)
 
 	def reset_vars(self):
 		self.feature_dictionary = {}
 		self.token_dictionary = {}
-		self.token_and_tag_vectors = {} # the vectors for each token as a given tag in association with a given feature set
+		self.token_and_tag_vectors = {} # the training window vectors for each token as a given tag in association with a given feature set
 		self.unknown_token_and_tag_vectors = {}
 		self.feature_count = 0
+		self.token_and_tag_weights = {} # the tags of each token, with a weight matrix of a row of 5*feature_count weights and a bias for each tag
+		self.unknown_token_and_tag_weights = self.empty_weights([])
+		self.sparse_weight_keys = None # the row*5*feature_count+column key of every nonzero weight of a binary model, sorted, used in place from its memory map
+		self.sparse_weight_values = None # the value of every nonzero weight of a binary model
+		self.training_examples = None # the tag row and window vector of every training example grouped by token, memory-mapped while training from a stream
+		self.training_groups = {} # the tags and the range of training examples of each token, and of the unknown tokens under None, while training from a stream
+		self.training_chunk_size = self.DEFAULT_CHUNK_SIZE # the number of training examples shuffled and read at a time while training from a stream
+		self.training_averaged = False # whether or not the perceptrons keep the average of their weights over every training step
+		self.training_held_out_fraction = 0.0 # the fraction of each token's window vectors held out to stop its perceptron early
+		self.training_patience = self.DEFAULT_PATIENCE # the number of epochs without a better held-out accuracy before a perceptron stops
+		self.training_report = [] # the time and held-out accuracy of each epoch of the last training
 
 	def load_model(self, model):
 		IS_KNOWN_TOKENS = 1
@@ -28,7 +57,8 @@ class MEMM:
 		IS_UNKNOWN = 4
 		current_state = 0
 		current_token = ""
-		current_tag = ""
+		current_weights = None
+		loaded_weights = {} # the weights of each token, and of the unknown tokens under None
 		for line in model:
 			if len(line) > 2:
 				if "TOKENS:\tTOKENS" in line:
@@ -38,30 +68,18 @@ class MEMM:
 				elif "TOKEN:\t" in line:
 					current_state = IS_TOKEN
 					current_token = line.split("TOKEN:\t")[1].strip()
-					self.token_and_tag_vectors[current_token] = {}
+					current_weights = {"tags": [], "weights": [], "bias": []} # the rows are stacked into the weight matrix once all are read
+					loaded_weights[current_token] = current_weights
 				elif "TAG:\t" in line:
-					current_tag = line.split("TAG:\t")[1].strip()
-					if current_state == IS_TOKEN:
-						self.token_and_tag_vectors[current_token][current_tag] = {}
-					elif current_state == IS_UNKNOWN:
-						self.unknown_token_and_tag_vectors[current_tag] = {}
+					current_weights["tags"].append(line.split("TAG:\t")[1].strip())
 				elif "BEST:\t" in line:
-					vector_text = line.split("BEST:\t")[1].strip().split(" ")
-					current_best_vector = [] # reset current best vector
-					for number in vector_text:
-						current_best_vector.append(int(number))
-					if current_state == IS_TOKEN:
-						self.token_and_tag_vectors[current_token][current_tag]["best"] = current_best_vector
-					elif current_state == IS_UNKNOWN:
-						self.unknown_token_and_tag_vectors[current_tag]["best"] = current_best_vector
+					current_weights["weights"].append(np.array(line.split("BEST:\t")[1].split(), dtype=np.int64))
 				elif "BIAS:\t" in line:
-					current_bias = int(line.split("BIAS:\t")[1].strip())
-					if current_state == IS_TOKEN:
-						self.token_and_tag_vectors[current_token][current_tag]["bias"] = current_bias
-					elif current_state == IS_UNKNOWN:
-						self.unknown_token_and_tag_vectors[current_tag]["bias"] = current_bias
+					current_weights["bias"].append(int(line.split("BIAS:\t")[1].strip()))
 				elif "UNKNOWN:\tUNKNOWN" in line:
 					current_state = IS_UNKNOWN
+					current_weights = {"tags": [], "weights": [], "bias": []}
+					loaded_weights[None] = current_weights
 				else:
 					if current_state == IS_KNOWN_TOKENS:
 						known_tokens = line.split(" ")
@@ -76,71 +94,104 @@ class MEMM:
 							self.feature_dictionary[feature.strip()] = i
 							i += 1
 						self.feature_count = i
+		for token in loaded_weights:
+			token_weights = self.empty_weights(loaded_weights[token]["tags"])
+			if len(loaded_weights[token]["tags"]) > 0:
+				token_weights["weights"] = self.narrow_weights(np.vstack(loaded_weights[token]["weights"]))
+				token_weights["bias"] = self.narrow_weights(np.array(loaded_weights[token]["bias"], dtype=np.int64))
+			if token is None:
+				self.unknown_token_and_tag_weights = token_weights
+			else:
+				self.token_and_tag_weights[token] = token_weights
 
-	def get_pos_tags(self, sentence, to_lowercase=DEFAULT_TO_LOWERCASE):
-		tag_predictions = [] # return array
-		i = 0
-		while i < len(sentence):
-			token_minus_2 = None
-			token_minus_1 = None
-			token_plus_1 = None
-			token_plus_2 = None
-			if i >= 1:
-				token_minus_1 = sentence[i-1]
-				if to_lowercase:
-					token_minus_1 = token_minus_1.lower()
-				if i >= 2:
-					token_minus_2 = sentence[i-2]
-					if to_lowercase:
-						token_minus_2 = token_minus_2.lower()
-			if i+1 < len(sentence):
-				token_plus_1 = sentence[i+1]
-				if to_lowercase:
-					token_plus_1 = token_plus_1.lower()
-				if i+2 < len(sentence):
-					token_plus_2 = sentence[i+2]
-					if to_lowercase:
-						token_plus_2 = token_plus_2.lower()
-			token = sentence[i]
+	def load_binary_model(self, model_path):
+		values, arrays = binary_model.read_binary_model(model_path, "MEMM")
+		tokens = binary_model.decode_strings(arrays["tokens"], values["token_count"])
+		self.token_dictionary = dict(zip(tokens, range(len(tokens))))
+		features = binary_model.decode_strings(arrays["features"], values["feature_count"])
+		self.feature_dictionary = dict(zip(features, range(len(features))))
+		self.feature_count = len(features)
+		tags = binary_model.decode_strings(arrays["tags"], values["tag_count"])
+		row_tags = [tags[tag_id] for tag_id in arrays["row_tags"].tolist()]
+		row_offsets = arrays["weighted_token_row_offsets"].tolist()
+		# the weights stay sparse and in the memory map, each token keeping only its tags, biases and first row
+		self.sparse_weight_keys = arrays["weight_keys"]
+		self.sparse_weight_values = arrays["weight_values"]
+		weighted_tokens = binary_model.decode_strings(arrays["weighted_tokens"], values["weighted_token_count"])
+		for i, token in enumerate(weighted_tokens+[None]): # the unknown tokens are last
+			start = row_offsets[i]
+			end = row_offsets[i+1]
+			token_weights = {"tags": row_tags[start:end], "weights": None, "bias": arrays["row_bias"][start:end], "first_row": start}
+			token_weights["row_keys"] = np.arange(start, end, dtype=np.int64)*(5*self.feature_count) # the key of the first column of each row, added to the feature indices of a window to look up its weights
+			if token is None:
+				self.unknown_token_and_tag_weights = token_weights
+			else:
+				self.token_and_tag_weights[token] = token_weights
+
+	def get_instrumentation_stats(self):
+		if self.instrumentation is None:
+			return {}
+		return self.instrumentation.get_stats()
+
+	def count_unknown_tokens(self, sentence, to_lowercase=DEFAULT_TO_LOWERCASE): # the tokens scored with the weights of the unknown tokens
+		return sum(self.find_unknown_tokens(sentence, to_lowercase=to_lowercase))
+
+	def find_unknown_tokens(self, sentence, to_lowercase=DEFAULT_TO_LOWERCASE): # whether or not each token is unknown to the model
+		unknown_tokens = []
+		for token in sentence:
 			if to_lowercase:
 				token = token.lower()
-			vector_minus_2 = self.empty_vector(self.feature_count)
-			if token_minus_2 is not None and token_minus_2 in self.feature_dictionary:
-				vector_minus_2[self.feature_dictionary[token_minus_2]] = 1
-			vector_minus_1 = self.empty_vector(self.feature_count)
-			if token_minus_1 is not None and token_minus_1 in self.feature_dictionary:
-				vector_minus_1[self.feature_dictionary[token_minus_1]] = 1
-			vector_token = self.empty_vector(self.feature_count)
-			if token in self.feature_dictionary:
-				vector_token[self.feature_dictionary[token]] = 1
-			vector_plus_1 = self.empty_vector(self.feature_count)
-			if token_plus_1 is not None and token_plus_1 in self.feature_dictionary:
-				vector_plus_1[self.feature_dictionary[token_plus_1]] = 1
-			vector_plus_2 = self.empty_vector(self.feature_count)
-			if token_plus_2 is not None and token_plus_2 in self.feature_dictionary:
-				vector_plus_2[self.feature_dictionary[token_plus_2]] = 1
-			current_vector = vector_minus_2 + vector_minus_1 + vector_token + vector_plus_1 + vector_plus_2 # total vector is concatenation of vectors for window
-			current_token_and_tag_vectors = {}
-			if token not in self.token_and_tag_vectors:
-				current_token_and_tag_vectors = self.unknown_token_and_tag_vectors
-			else:
-				current_token_and_tag_vectors = self.token_and_tag_vectors[token]
-			highest_tag_similarity_score = 0
+			unknown_tokens.append(token not in self.token_and_tag_weights)
+		return unknown_tokens
+
+	def get_table_sizes(self): # the size of the dictionaries, the number of rows and weights of the perceptrons, and the bytes of the weights
+		all_token_weights = list(self.token_and_tag_weights.values())+[self.unknown_token_and_tag_weights]
+		table_sizes = {"token": len(self.token_dictionary), "feature": self.feature_count, "weighted_token": len(self.token_and_tag_weights), "tag_row": sum([len(token_weights["tags"]) for token_weights in all_token_weights])}
+		if self.sparse_weight_keys is not None: # a binary model keeps only the nonzero weights
+			table_sizes["weight"] = len(self.sparse_weight_keys)
+			table_sizes["weight_bytes"] = self.sparse_weight_keys.nbytes+self.sparse_weight_values.nbytes
+		else:
+			table_sizes["weight"] = sum([token_weights["weights"].size for token_weights in all_token_weights])
+			table_sizes["weight_bytes"] = sum([token_weights["weights"].nbytes for token_weights in all_token_weights])
+		return table_sizes
+
+	def narrow_weights(self, weights): # the summed weights of an averaged perceptron can outgrow 32 bits, otherwise keep them small
+		if weights.size == 0 or (weights.min() >= np.iinfo(np.int32).min and weights.max() <= np.iinfo(np.int32).max):
+			return weights.astype(np.int32)
+		return weights
+
+	def get_pos_tags(self, sentence, to_lowercase=DEFAULT_TO_LOWERCASE):
+		tokens = sentence
+		if to_lowercase:
+			tokens = [token.lower() for token in sentence]
+		window_feature_ids = self.get_window_feature_ids(tokens)
+		tag_predictions = [] # return array
+		for i, token in enumerate(tokens):
+			current_token_and_tag_weights = self.token_and_tag_weights.get(token, self.unknown_token_and_tag_weights)
+			tags = current_token_and_tag_weights["tags"]
 			tag_prediction = ""
-			for tag in current_token_and_tag_vectors:
-				best_vector = current_token_and_tag_vectors[tag]["best"]
-				bias = current_token_and_tag_vectors[tag]["bias"]
-				current_tag_similarity_score = self.get_similarity_score(best_vector, current_vector)-bias
-				if len(tag_prediction) == 0 or current_tag_similarity_score > highest_tag_similarity_score:
-					highest_tag_similarity_score = current_tag_similarity_score
-					tag_prediction = tag
+			if len(tags) == 1: # a token seen with only one tag needs no scoring
+				tag_prediction = tags[0]
+			elif len(tags) > 1: # the first of the highest scoring tags
+				current_vector = self.get_window_indices(window_feature_ids, i)
+				tag_similarity_scores = self.get_similarity_scores(current_token_and_tag_weights, current_vector)
+				tag_prediction = tags[int(np.argmax(tag_similarity_scores))]
 			tag_predictions.append(tag_prediction)
-			i += 1
 		return tag_predictions
 
+	def tag_stream(self, lines, to_lowercase=DEFAULT_TO_LOWERCASE, tagged=None): # yields the (token, tag) pairs of each sentence of lines of tokens as soon as the blank line ending it is read
+		return stream.tag_stream(self, lines, to_lowercase=to_lowercase, tagged=tagged)
+
+	def get_window_feature_ids(self, tokens): # the feature id of each token of a sentence, or -1 if it is not a feature, with two -1s at each end for the window to slide over
+		return [-1, -1]+[self.feature_dictionary.get(token, -1) for token in tokens]+[-1, -1]
+
+	def get_window_indices(self, window_feature_ids, i): # the feature indices of the window of the i-th token, the same as get_feature_indices of its window tokens
+		return [window_feature_ids[i+offset]+offset*self.feature_count for offset in range(5) if window_feature_ids[i+offset] >= 0]
+
 	# development function
-	def set_model(self, data, minimum_for_token=DEFAULT_MIN_TOKEN_OCCURRENCES, minimum_for_feature=DEFAULT_MIN_FEATURE_OCCURRENCES, to_lowercase=DEFAULT_TO_LOWERCASE, max_epochs=DEFAULT_MAX_EPOCHS):
+	def set_model(self, data, minimum_for_token=DEFAULT_MIN_TOKEN_OCCURRENCES, minimum_for_feature=DEFAULT_MIN_FEATURE_OCCURRENCES, to_lowercase=DEFAULT_TO_LOWERCASE, max_epochs=DEFAULT_MAX_EPOCHS, processes=None, seed=DEFAULT_SEED, averaged=False, held_out_fraction=0.0, patience=DEFAULT_PATIENCE):
 		self.reset_vars()
+		self.set_training_options(averaged, held_out_fraction, patience)
 		self.build_token_dictionary(data, minimum_for_token, to_lowercase)
 		data.seek(0)
 		self.build_feature_dictionary(data, minimum_for_feature, to_lowercase)
@@ -175,48 +226,165 @@ class MEMM:
 					if to_lowercase:
 						token_plus_2 = token_plus_2.lower()
 			line = lines[i]
-			if "\t" in line and len(line) > 2:
+			if stream.is_token_line(line):
 				token_and_tag = line.split("\t")
 				token = token_and_tag[0].strip()
 				if to_lowercase:
 					token = token.lower()
 				tag = token_and_tag[1].strip()
-				vector_minus_2 = self.empty_vector(self.feature_count)
-				if token_minus_2 is not None and token_minus_2 in self.feature_dictionary:
-					vector_minus_2[self.feature_dictionary[token_minus_2]] = 1
-				vector_minus_1 = self.empty_vector(self.feature_count)
-				if token_minus_1 is not None and token_minus_1 in self.feature_dictionary:
-					vector_minus_1[self.feature_dictionary[token_minus_1]] = 1
-				vector_token = self.empty_vector(self.feature_count)
-				if token in self.feature_dictionary:
-					vector_token[self.feature_dictionary[token]] = 1
-				vector_plus_1 = self.empty_vector(self.feature_count)
-				if token_plus_1 is not None and token_plus_1 in self.feature_dictionary:
-					vector_plus_1[self.feature_dictionary[token_plus_1]] = 1
-				vector_plus_2 = self.empty_vector(self.feature_count)
-				if token_plus_2 is not None and token_plus_2 in self.feature_dictionary:
-					vector_plus_2[self.feature_dictionary[token_plus_2]] = 1
-				vector = vector_minus_2 + vector_minus_1 + vector_token + vector_plus_1 + vector_plus_2 # total vector is concatenation of vectors for window
+				vector = self.get_feature_indices([token_minus_2, token_minus_1, token, token_plus_1, token_plus_2])
 				if token in self.token_dictionary: # token was seen enough in data to include as a known token
 					if token in self.token_and_tag_vectors:
 						if tag in self.token_and_tag_vectors[token]:
 							self.token_and_tag_vectors[token][tag]["vectors"].append(vector)
 						else:
-							self.token_and_tag_vectors[token][tag] = {"vectors": [vector], "best": self.empty_vector(self.feature_count*5), "bias": 0}
+							self.token_and_tag_vectors[token][tag] = {"vectors": [vector]}
 					else:
-						self.token_and_tag_vectors[token] = {tag: {"vectors": [vector], "best": self.empty_vector(self.feature_count*5), "bias": 0}}
+						self.token_and_tag_vectors[token] = {tag: {"vectors": [vector]}}
 				else: # treat as unknown
 					if tag in self.unknown_token_and_tag_vectors:
 						self.unknown_token_and_tag_vectors[tag]["vectors"].append(vector)
 					else:
-						self.unknown_token_and_tag_vectors[tag] = {"vectors": [vector], "best": self.empty_vector(self.feature_count*5), "bias": 0}
+						self.unknown_token_and_tag_vectors[tag] = {"vectors": [vector]}
 			i += 1
-		self.set_best_vectors(max_epochs)
+		self.set_best_vectors(max_epochs, processes=processes, seed=seed)
+
+	# development function
+	def set_model_streaming(self, data, minimum_for_token=DEFAULT_MIN_TOKEN_OCCURRENCES, minimum_for_feature=DEFAULT_MIN_FEATURE_OCCURRENCES, to_lowercase=DEFAULT_TO_LOWERCASE, max_epochs=DEFAULT_MAX_EPOCHS, processes=None, seed=DEFAULT_SEED, averaged=False, held_out_fraction=0.0, patience=DEFAULT_PATIENCE, chunk_size=DEFAULT_CHUNK_SIZE, spill_directory=None):
+		# reads the data once, spooling every line to disk as a token id and a tag id while counting the dictionaries, then
+		# builds the window vector of every token from the spool and groups them by token in a memory-mapped file, which the
+		# perceptrons read a chunk at a time, so only the dictionaries, the weights and a few chunks are held in memory.
+		# when every token's window vectors fit in one chunk, this gives the same model as set_model
+		self.reset_vars()
+		self.set_training_options(averaged, held_out_fraction, patience)
+		self.training_chunk_size = chunk_size
+		with tempfile.TemporaryDirectory(dir=spill_directory) as directory:
+			line_count, token_ids, token_counts, tags = self.spool_lines(data, os.path.join(directory, "lines"), to_lowercase, chunk_size)
+			for token_id in token_counts: # in the order the tokens were first counted, as in build_token_dictionary
+				if token_counts[token_id] > minimum_for_token:
+					self.token_dictionary[token_ids[token_id]] = len(self.token_dictionary)
+				if token_counts[token_id] > minimum_for_feature:
+					self.feature_dictionary[token_ids[token_id]] = len(self.feature_dictionary)
+			self.feature_count = len(self.feature_dictionary)
+			example_count, group_tags, tag_rows, group_offsets = self.spool_examples(os.path.join(directory, "lines"), line_count, token_ids, tags, os.path.join(directory, "examples"), chunk_size)
+			self.group_examples(os.path.join(directory, "examples"), example_count, len(tags), tag_rows, group_offsets, os.path.join(directory, "grouped_examples"), chunk_size)
+			self.training_examples = self.open_spool(os.path.join(directory, "grouped_examples"), example_count, 6, "r+")
+			for token in list(self.token_dictionary)+[None]:
+				group = len(self.token_dictionary)
+				if token is not None:
+					group = self.token_dictionary[token]
+				self.training_groups[token] = (group_tags[group], int(group_offsets[group*len(tags)]), int(group_offsets[(group+1)*len(tags)]))
+			self.set_best_vectors(max_epochs, processes=processes, seed=seed)
+			self.training_examples = None
+			self.training_groups = {}
+
+	def spool_lines(self, data, spool_path, to_lowercase, chunk_size):
+		# writes the token id and the tag id (-1 for lines without a tag) of every line, returning the number of lines, the token
+		# of each token id, the count of each token id in the order they were first counted, and the tag of each tag id
+		token_ids = {}
+		token_counts = {}
+		tag_ids = {}
+		line_count = 0
+		ids = []
+		with open(spool_path, "wb") as spool:
+			for line in data:
+				token = line.split("\t")[0].strip()
+				if to_lowercase:
+					token = token.lower()
+				token_id = token_ids.setdefault(token, len(token_ids))
+				tag_id = -1
+				if stream.is_token_line(line):
+					tag_id = tag_ids.setdefault(line.split("\t")[1].strip(), len(tag_ids))
+					token_counts[token_id] = token_counts.get(token_id, 0)+1
+				ids.append(token_id)
+				ids.append(tag_id)
+				line_count += 1
+				if len(ids) >= 2*chunk_size:
+					spool.write(np.array(ids, dtype=np.int32).tobytes())
+					ids = []
+			spool.write(np.array(ids, dtype=np.int32).tobytes())
+		return line_count, list(token_ids), token_counts, list(tag_ids)
+
+	def spool_examples(self, lines_path, line_count, token_ids, tags, spool_path, chunk_size):
+		# writes the group (the token row, or the unknown tokens after the last row), the tag id and the window vector (5 feature
+		# indices, -1 where the token in the window is not a feature) of every tagged line. returns the number of examples, the
+		# tags of each group in the order they were first seen, the row of each group and tag id in the tags of the group, and
+		# the start of the examples of each group and tag row in the grouped examples, laid out by group and then by tag row
+		token_id_of = dict(zip(token_ids, range(len(token_ids))))
+		feature_indices = np.full(len(token_ids), -1, dtype=np.int64)
+		for feature in self.feature_dictionary:
+			feature_indices[token_id_of[feature]] = self.feature_dictionary[feature]
+		group_count = len(self.token_dictionary)+1
+		groups = np.full(len(token_ids), group_count-1, dtype=np.int64)
+		for token in self.token_dictionary:
+			groups[token_id_of[token]] = self.token_dictionary[token]
+		tag_count = len(tags)
+		tag_rows = np.full(group_count*tag_count, -1, dtype=np.int64) # the row of each group and tag in the tags of the group
+		tag_counts = np.zeros(group_count*tag_count, dtype=np.int64)
+		group_tags = [[] for _ in range(group_count)]
+		example_count = 0
+		lines = self.open_spool(lines_path, line_count, 2, "r")
+		with open(spool_path, "wb") as spool:
+			for start in range(0, line_count, chunk_size):
+				end = min(start+chunk_size, line_count)
+				positions = np.arange(start, end)[lines[start:end, 1] >= 0]
+				examples = np.full((len(positions), 7), -1, dtype=np.int32)
+				examples[:, 0] = groups[lines[positions, 0]]
+				examples[:, 1] = lines[positions, 1]
+				window_start = max(start-2, 0)
+				window_features = feature_indices[lines[window_start:min(end+2, line_count), 0]]
+				for offset in range(5):
+					window_positions = positions+offset-2
+					is_in_data = (window_positions >= 0) & (window_positions < line_count)
+					features = np.full(len(positions), -1, dtype=np.int64)
+					features[is_in_data] = window_features[window_positions[is_in_data]-window_start]
+					examples[:, 2+offset] = np.where(features >= 0, offset*self.feature_count+features, -1)
+				keys = examples[:, 0].astype(np.int64)*tag_count+examples[:, 1]
+				unique_keys, first_indices = np.unique(keys, return_index=True)
+				for key in unique_keys[np.argsort(first_indices)].tolist():
+					if tag_rows[key] < 0:
+						tag_rows[key] = len(group_tags[key//tag_count])
+						group_tags[key//tag_count].append(tags[key%tag_count])
+				tag_counts += np.bincount(keys, minlength=len(tag_counts))
+				spool.write(examples.tobytes())
+				example_count += len(examples)
+		# lay out the counts by group and tag row
+		ordered_counts = np.zeros(group_count*tag_count, dtype=np.int64)
+		is_seen = tag_rows >= 0
+		ordered_counts[(np.arange(len(tag_rows))//tag_count*tag_count+tag_rows)[is_seen]] = tag_counts[is_seen]
+		return example_count, group_tags, tag_rows, np.concatenate([[0], np.cumsum(ordered_counts)])
+
+	def group_examples(self, examples_path, example_count, tag_count, tag_rows, group_offsets, spool_path, chunk_size):
+		# writes the tag row and window vector of every example so the examples of each group, and within a group of each tag,
+		# are together and keep the order they were seen in
+		next_indices = group_offsets[:-1].copy()
+		examples = self.open_spool(examples_path, example_count, 7, "r")
+		grouped_examples = self.open_spool(spool_path, example_count, 6, "w+")
+		for start in range(0, example_count, chunk_size):
+			chunk = examples[start:start+chunk_size]
+			chunk_tag_rows = tag_rows[chunk[:, 0].astype(np.int64)*tag_count+chunk[:, 1]]
+			keys = chunk[:, 0].astype(np.int64)*tag_count+chunk_tag_rows
+			order = np.argsort(keys, kind="stable")
+			sorted_keys = keys[order]
+			ranks = np.arange(len(sorted_keys))-np.searchsorted(sorted_keys, sorted_keys)
+			indices = next_indices[sorted_keys]+ranks
+			grouped_examples[indices, 0] = chunk_tag_rows[order]
+			grouped_examples[indices, 1:] = chunk[order, 2:]
+			next_indices += np.bincount(keys, minlength=len(next_indices))
+		if example_count > 0:
+			grouped_examples.flush()
+
+	def open_spool(self, spool_path, row_count, column_count, mode): # a memory map of a spool of rows of 32 bit integers
+		if row_count == 0: # an empty file cannot be memory-mapped
+			if mode == "w+":
+				open(spool_path, "wb").close()
+			return np.zeros((0, column_count), dtype=np.int32)
+		return np.memmap(spool_path, dtype=np.int32, mode=mode, shape=(row_count, column_count))
 
 	def build_token_dictionary(self, data, minimum_for_token, to_lowercase):
 		token_counts = {}
 		for line in data:
-			if "\t" in line and len(line) > 2:
+			if stream.is_token_line(line):
 				token_and_tag = line.split("\t")
 				token = token_and_tag[0].strip()
 				if to_lowercase:
@@ -234,7 +402,7 @@ class MEMM:
 	def build_feature_dictionary(self, data, minimum_for_feature, to_lowercase):
 		feature_counts = {}
 		for line in data:
-			if "\t" in line and len(line) > 2:
+			if stream.is_token_line(line):
 				token_and_tag = line.split("\t")
 				token = token_and_tag[0].strip()
 				if to_lowercase:
@@ -251,120 +419,316 @@ class MEMM:
 		self.feature_count = i
 
 	# development function
-	def save_model(self, save_path):
+	def save_model(self, save_path, binary=False):
+		if binary:
+			self.save_binary_model(save_path)
+			return
 		known_tokens_string = "TOKENS:\tTOKENS\n"
 		for known_token in self.token_dictionary.keys():
 			known_tokens_string += "%s " % known_token
 		features_string = "FEATURES:\tFEATURES\n"
 		for feature in self.feature_dictionary.keys():
 			features_string += "%s " % feature
-		token_string = ""
-		for token in self.token_and_tag_vectors:
-			token_string += "TOKEN:\t%s\n" % token
-			for tag in self.token_and_tag_vectors[token]:
-				vector_string = ""
-				for number in self.token_and_tag_vectors[token][tag]["best"]:
-					vector_string += "%d " % number
-				token_string += "TAG:\t%s\nBEST:\t%s\nBIAS:\t%d\n" % (tag, vector_string, self.token_and_tag_vectors[token][tag]["bias"])
+		token_strings = []
+		for token in self.token_and_tag_weights:
+			token_strings.append("TOKEN:\t%s\n" % token)
+			token_weights = self.token_and_tag_weights[token]
+			for i, tag in enumerate(token_weights["tags"]):
+				vector_string = "".join(["%d " % number for number in self.get_dense_weights(token_weights)[i].tolist()])
+				token_strings.append("TAG:\t%s\nBEST:\t%s\nBIAS:\t%d\n" % (tag, vector_string, token_weights["bias"][i]))
+		token_string = "".join(token_strings)
 		unknown_token_string = "UNKNOWN:\tUNKNOWN\n"
-		for tag in self.unknown_token_and_tag_vectors:
-			vector_string = ""
-			for number in self.unknown_token_and_tag_vectors[tag]["best"]:
-				vector_string += "%d " % number
-			unknown_token_string += "TAG:\t%s\nBEST:\t%s\nBIAS:\t%d\n" % (tag, vector_string.strip(), self.unknown_token_and_tag_vectors[tag]["bias"])
+		for i, tag in enumerate(self.unknown_token_and_tag_weights["tags"]):
+			vector_string = "".join(["%d " % number for number in self.get_dense_weights(self.unknown_token_and_tag_weights)[i].tolist()])
+			unknown_token_string += "TAG:\t%s\nBEST:\t%s\nBIAS:\t%d\n" % (tag, vector_string.strip(), self.unknown_token_and_tag_weights["bias"][i])
 		model_string = "%s\n\n\n%s\n\n\n%s\n\n\n%s" % (known_tokens_string.strip(), features_string.strip(), token_string.strip(), unknown_token_string.strip())
 		# save the model
 		with open(save_path, "w") as model_file:
 			model_file.write(model_string)
 
-	def set_best_vectors(self, max_epochs):
+	# development function
+	def save_binary_model(self, save_path):
+		# the weights are saved sparsely: the rows of every token's tags are numbered in order, with the unknown tokens last,
+		# and only the nonzero weights are kept, keyed by row*5*feature_count+column so the keys are sorted
+		column_count = 5*self.feature_count
+		tag_ids = {}
+		row_tags = []
+		row_offsets = [0]
+		biases = []
+		keys = [np.zeros(0, dtype=np.int64)]
+		values = [np.zeros(0, dtype=np.int64)]
+		for token_weights in list(self.token_and_tag_weights.values())+[self.unknown_token_and_tag_weights]:
+			weights = self.get_dense_weights(token_weights)
+			for i, tag in enumerate(token_weights["tags"]):
+				if tag not in tag_ids:
+					tag_ids[tag] = len(tag_ids)
+				row_tags.append(tag_ids[tag])
+				columns = np.flatnonzero(weights[i])
+				keys.append((len(row_tags)-1)*column_count+columns.astype(np.int64))
+				values.append(weights[i][columns].astype(np.int64))
+			biases.extend(np.asarray(token_weights["bias"], dtype=np.int64).tolist())
+			row_offsets.append(len(row_tags))
+		model_values = {"token_count": len(self.token_dictionary), "feature_count": self.feature_count, "tag_count": len(tag_ids), "weighted_token_count": len(self.token_and_tag_weights)}
+		arrays = {}
+		arrays["tokens"] = binary_model.encode_strings(list(self.token_dictionary))
+		arrays["features"] = binary_model.encode_strings(list(self.feature_dictionary))
+		arrays["tags"] = binary_model.encode_strings(list(tag_ids))
+		arrays["weighted_tokens"] = binary_model.encode_strings(list(self.token_and_tag_weights))
+		arrays["weighted_token_row_offsets"] = np.array(row_offsets, dtype=np.int64)
+		arrays["row_tags"] = np.array(row_tags, dtype=np.int32)
+		arrays["row_bias"] = self.narrow_weights(np.array(biases, dtype=np.int64))
+		arrays["weight_keys"] = np.concatenate(keys)
+		arrays["weight_values"] = self.narrow_weights(np.concatenate(values))
+		binary_model.write_binary_model(save_path, "MEMM", model_values, arrays)
+
+	def get_dense_weights(self, token_weights): # the weight matrix of a token, built from the sparse weights of a binary model if need be
+		if token_weights["weights"] is not None:
+			return token_weights["weights"]
+		column_count = 5*self.feature_count
+		first_row = token_weights["first_row"]
+		start, end = np.searchsorted(self.sparse_weight_keys, [first_row*column_count, (first_row+len(token_weights["tags"]))*column_count])
+		weights = np.zeros((len(token_weights["tags"]), column_count), dtype=self.sparse_weight_values.dtype)
+		keys = self.sparse_weight_keys[start:end]-first_row*column_count
+		weights[keys//column_count, keys%column_count] = self.sparse_weight_values[start:end]
+		return weights
+
+	def set_training_options(self, averaged, held_out_fraction, patience):
+		# an averaged perceptron uses the average of its weights over every training step, which changes less from one epoch
+		# to the next. with a held-out fraction, each perceptron is scored on its held-out window vectors after every epoch,
+		# stops once the score has not improved for patience epochs, and keeps the weights of its best epoch
+		self.training_averaged = averaged
+		self.training_held_out_fraction = held_out_fraction
+		self.training_patience = patience
+
+	def set_best_vectors(self, max_epochs, processes=None, seed=DEFAULT_SEED):
+		# the perceptron of each token, and of the unknown tokens under None, shares nothing with the others and shuffles with its
+		# own random number generator, so they can be trained in any order and in any process with the same results
+		tokens = list(self.token_and_tag_vectors)+[None]
+		if self.training_examples is not None:
+			tokens = list(self.training_groups)
+		tasks = [(token, max_epochs, seed) for token in sorted(tokens, key=self.get_training_size, reverse=True)] # start the largest first, so they do not hold up the end
+		if processes is not None and processes > 1:
+			results = list(parallel.map_model(self, "get_best_weights", tasks, processes=processes))
+		else:
+			results = [self.get_best_weights(*task) for task in tasks]
+		token_weights = {}
+		for token, tag_weights, epoch_stats in results:
+			token_weights[token] = tag_weights
+		for token in tokens:
+			if token is not None:
+				self.token_and_tag_weights[token] = token_weights[token]
+		self.unknown_token_and_tag_weights = token_weights[None]
+		self.training_report = self.get_training_report([epoch_stats for token, tag_weights, epoch_stats in results])
+
+	def get_training_report(self, token_epoch_stats):
+		# the time spent in each epoch by all perceptrons, and the held-out accuracy of the model after each epoch. since each
+		# token is tagged by its own perceptron, the held-out accuracy of the model is the sum of the held-out accuracy of every
+		# perceptron, each of which keeps the weights of its best epoch once it stops
+		training_report = []
+		epoch_count = max([len(epoch_stats) for epoch_stats in token_epoch_stats]+[0])
+		held_out_total = sum([epoch_stats[0][2] for epoch_stats in token_epoch_stats if len(epoch_stats) > 0])
+		for i in range(epoch_count):
+			seconds = 0.0
+			held_out_correct = 0
+			token_count = 0
+			for epoch_stats in token_epoch_stats:
+				if i < len(epoch_stats):
+					seconds += epoch_stats[i][0]
+					held_out_correct += epoch_stats[i][1]
+					token_count += 1
+				elif len(epoch_stats) > 0:
+					held_out_correct += max([correct for _, correct, _ in epoch_stats])
+			held_out_accuracy = None
+			if held_out_total > 0:
+				held_out_accuracy = held_out_correct/held_out_total
+			training_report.append({"epoch": i+1, "seconds": seconds, "tokens": token_count, "held_out_correct": held_out_correct, "held_out_total": held_out_total, "held_out_accuracy": held_out_accuracy})
+		return training_report
+
+	def get_training_size(self, token): # the number of window vectors times the number of tags, which the time to train the perceptron of a token grows with
+		if self.training_examples is not None:
+			tags, start, end = self.training_groups[token]
+			return (end-start)*len(tags)
+		token_and_tag_vectors = self.get_token_and_tag_vectors(token)
+		return sum([len(token_and_tag_vectors[tag]["vectors"]) for tag in token_and_tag_vectors])*len(token_and_tag_vectors)
+
+	def get_token_and_tag_vectors(self, token):
+		if token is None:
+			return self.unknown_token_and_tag_vectors
+		return self.token_and_tag_vectors[token]
+
+	def get_best_weights(self, token, max_epochs, seed=DEFAULT_SEED): # returns the token with the weights of its perceptron and the time and held-out score of each epoch
+		rng = random.Random("%s\tUNKNOWN\t" % seed) # a random number generator seeded by the token, so the order the tokens are trained in does not matter
+		if token is not None:
+			rng = random.Random("%s\tTOKEN\t%s" % (seed, token))
+		if self.training_examples is not None:
+			tags, start, end = self.training_groups[token]
+			tag_weights = self.empty_weights(tags)
+			epoch_stats = self.perceptron_best_weights_streaming(self.training_examples[start:end], tag_weights, max_epochs, rng)
+			return token, tag_weights, epoch_stats
 		# rearrange the token and tag vector data for the perceptron
-		for token in self.token_and_tag_vectors:
-			tag_vectors = []
-			current_best_tag_vectors = {}
-			for tag in self.token_and_tag_vectors[token]:
-				for vector in self.token_and_tag_vectors[token][tag]["vectors"]:
-					tag_vectors.append({"tag": tag, "vector": vector})
-				current_best_tag_vectors[tag] = {"best": self.token_and_tag_vectors[token][tag]["best"], "bias": self.token_and_tag_vectors[token][tag]["bias"]}
-			updated_best_tag_vectors = self.perceptron_best_vectors(tag_vectors, current_best_tag_vectors, max_epochs)
-			# save the best vectors for the appropriate token
-			for tag in self.token_and_tag_vectors[token]:
-				self.token_and_tag_vectors[token][tag]["best"] = updated_best_tag_vectors[tag]["best"]
-				self.token_and_tag_vectors[token][tag]["bias"] = updated_best_tag_vectors[tag]["bias"]
-		# do the same for the unknown tokens
-		unknown_tag_vectors = []
-		current_best_unknown_tag_vectors = {}
-		for tag in self.unknown_token_and_tag_vectors:
-			for vector in self.unknown_token_and_tag_vectors[tag]["vectors"]:
-				unknown_tag_vectors.append({"tag": tag, "vector": vector})
-			current_best_unknown_tag_vectors[tag] = {"best": self.unknown_token_and_tag_vectors[tag]["best"], "bias": self.unknown_token_and_tag_vectors[tag]["bias"]}
-		updated_best_unknown_tag_vectors = self.perceptron_best_vectors(unknown_tag_vectors, current_best_unknown_tag_vectors, max_epochs)
-		for tag in self.unknown_token_and_tag_vectors:
-			self.unknown_token_and_tag_vectors[tag]["best"] = updated_best_unknown_tag_vectors[tag]["best"]
-			self.unknown_token_and_tag_vectors[tag]["bias"] = updated_best_unknown_tag_vectors[tag]["bias"]
-
-	def empty_vector(self, size): # build a vector of all 0s for perceptron
-		vector = []
+		token_and_tag_vectors = self.get_token_and_tag_vectors(token)
+		tag_weights = self.empty_weights(list(token_and_tag_vectors))
+		tag_vectors = []
+		for i, tag in enumerate(tag_weights["tags"]):
+			for vector in token_and_tag_vectors[tag]["vectors"]:
+				tag_vectors.append((i, vector))
+		epoch_stats = self.perceptron_best_weights(tag_vectors, tag_weights, max_epochs, rng)
+		return token, tag_weights, epoch_stats
+
+	def get_feature_indices(self, window_tokens):
+		# the window vector is the concatenation of a one-hot vector of features for each token in the window,
+		# so it is kept as only the indices of its 1s, at most one for each token in the window
+		feature_indices = []
+		offset = 0
+		for window_token in window_tokens:
+			if window_token is not None and window_token in self.feature_dictionary:
+				feature_indices.append(offset+self.feature_dictionary[window_token])
+			offset += self.feature_count
+		return feature_indices
+
+	def empty_weights(self, tags): # all 0 weights and biases for the perceptron of each tag
+		return {"tags": tags, "weights": np.zeros((len(tags), self.feature_count*5), dtype=np.int32), "bias": np.zeros(len(tags), dtype=np.int32)}
+
+	def perceptron_best_weights(self, tag_vectors, tag_weights, max_epochs, rng=random): # trains the weights of every tag in place, returning the time and held-out score of each epoch
+		tag_vectors, held_out_tag_vectors = self.split_held_out(tag_vectors)
+		perceptron = self.start_perceptron(tag_weights)
+		epoch_stats = []
+		has_converged = False
 		i = 0
-		while i < size:
-			vector.append(0)
+		while has_converged is False and i < max_epochs and not self.should_stop_perceptron(perceptron, epoch_stats):
+			start = time.time()
+			rng.shuffle(tag_vectors) # shuffle the data each epoch
+			has_converged = self.perceptron_epoch(tag_vectors, perceptron)
+			self.end_perceptron_epoch(perceptron, held_out_tag_vectors, epoch_stats, start)
 			i += 1
-		return vector
+		self.finish_perceptron(perceptron, tag_weights)
+		return epoch_stats
 
-	def perceptron_best_vectors(self, tag_vectors, best_tag_vectors, max_epochs):
+	def perceptron_best_weights_streaming(self, examples, tag_weights, max_epochs, rng=random): # trains the weights of every tag in place from memory-mapped examples
+		# the examples are shuffled by shuffling the order of their chunks and the examples within each chunk, and stay shuffled
+		# for the next epoch. with only one chunk this is the same shuffle as perceptron_best_weights
+		examples, held_out_tag_vectors = self.split_held_out_streaming(examples)
+		perceptron = self.start_perceptron(tag_weights)
+		epoch_stats = []
+		chunk_starts = list(range(0, len(examples), self.training_chunk_size))
 		has_converged = False
 		i = 0
-		while has_converged is False and i < max_epochs:
+		while has_converged is False and i < max_epochs and not self.should_stop_perceptron(perceptron, epoch_stats):
+			start = time.time()
 			has_converged = True # it has converged until proven otherwise
-			random.shuffle(tag_vectors) # shuffle the data each epoch
-			for tag_vector in tag_vectors: # run the perceptron through each of the shuffled data vectors for a given token
-				test_tag = tag_vector["tag"]
-				test_vector = tag_vector["vector"]
-				for tag in best_tag_vectors: # compare the data vector of the given token to the best vector of each possible tag for that token
-					best_vector = best_tag_vectors[tag]["best"]
-					bias = best_tag_vectors[tag]["bias"]
-					should_predict_tag = (tag == test_tag)
-					does_predict_tag = self.perceptron_decision(best_vector, test_vector, bias)
-					if should_predict_tag and does_predict_tag: # made correct prediction
-						continue
-					elif should_predict_tag and not does_predict_tag: # predicted it was tag, but should not have done so
-						has_converged = False
-						best_tag_vectors[tag]["bias"] = bias-1
-						best_tag_vectors[tag]["best"] = self.add_vectors(best_vector, test_vector)
-					elif not should_predict_tag and does_predict_tag: # predicted it was not the tag, but it was
-						has_converged = False
-						best_tag_vectors[tag]["bias"] = bias+1
-						best_tag_vectors[tag]["best"] = self.subtract_vectors(best_vector, test_vector)
+			rng.shuffle(chunk_starts)
+			for chunk_start in chunk_starts:
+				chunk = examples[chunk_start:chunk_start+self.training_chunk_size]
+				order = list(range(len(chunk)))
+				rng.shuffle(order)
+				chunk[:] = chunk[order]
+				if not self.perceptron_epoch(self.get_tag_vectors(chunk), perceptron):
+					has_converged = False
+			self.end_perceptron_epoch(perceptron, held_out_tag_vectors, epoch_stats, start)
 			i += 1
-		return best_tag_vectors
+		self.finish_perceptron(perceptron, tag_weights)
+		return epoch_stats
 
-	def perceptron_decision(self, w, x, bias): # returns true if the cosine similarity score is greater than the bias
-		if self.get_similarity_score(w, x) > bias:
-			return True
-		else:
-			return False
+	def get_tag_vectors(self, examples): # the tag row and feature indices of each memory-mapped example
+		return [(example[0], [i for i in example[1:] if i >= 0]) for example in examples.tolist()]
 
-	def get_similarity_score(self, w, x): # cosine similarity score
-		score = float(0.0)
-		i = 0
-		while i < len(w):
-			add_amount = float(w[i]) * float(x[i])
-			score += add_amount
-			i += 1
-		return score
+	def is_held_out(self, i): # whether or not the i-th window vector of a token is held out, spreading the held-out vectors evenly
+		return int((i+1)*self.training_held_out_fraction) > int(i*self.training_held_out_fraction)
 
-	def add_vectors(self, w, x): # add two vectors
-		new_vector = list(w)
-		i = 0
-		while i < len(new_vector):
-			new_vector[i] += x[i]
-			i += 1
-		return new_vector
+	def split_held_out(self, tag_vectors):
+		if self.training_held_out_fraction <= 0:
+			return tag_vectors, []
+		kept_tag_vectors = []
+		held_out_tag_vectors = []
+		for i, tag_vector in enumerate(tag_vectors):
+			if self.is_held_out(i):
+				held_out_tag_vectors.append(tag_vector)
+			else:
+				kept_tag_vectors.append(tag_vector)
+		return kept_tag_vectors, held_out_tag_vectors
 
-	def subtract_vectors(self, w, x): # subtract two vectors
-		new_vector = list(w)
-		i = 0
-		while i < len(new_vector):
-			new_vector[i] -= x[i]
-			i += 1
-		return new_vector
\ No newline at end of file
+	def split_held_out_streaming(self, examples): # moves the kept examples to the front in place, returning them and the held-out window vectors
+		if self.training_held_out_fraction <= 0:
+			return examples, []
+		kept_count = 0
+		held_out_tag_vectors = []
+		for start in range(0, len(examples), self.training_chunk_size):
+			chunk = np.array(examples[start:start+self.training_chunk_size])
+			is_held_out = np.array([self.is_held_out(i) for i in range(start, start+len(chunk))], dtype=bool)
+			held_out_tag_vectors.extend(self.get_tag_vectors(chunk[is_held_out]))
+			kept_chunk = chunk[~is_held_out]
+			examples[kept_count:kept_count+len(kept_chunk)] = kept_chunk # the chunk is a copy, so the kept examples can move forward over it
+			kept_count += len(kept_chunk)
+		return examples[:kept_count], held_out_tag_vectors
+
+	def start_perceptron(self, tag_weights): # the training state of the perceptron of a token
+		perceptron = {"weights": tag_weights["weights"], "bias": tag_weights["bias"], "step": 0, "best_weights": None, "best_epoch": 0}
+		perceptron["should_predict_tags"] = np.eye(len(tag_weights["tags"]), dtype=np.int32) # the row for the tag of a window vector is 1 for that tag and 0 for the others
+		if self.training_averaged:
+			# for the average of the weights over every step, each update is also added times the step it was made at, so
+			# the sum of the weights over the steps is (steps+1)*weights - (sum of updates times their step), without
+			# having to add the current weights to the sum at every step
+			perceptron["weight_updates"] = np.zeros(tag_weights["weights"].shape, dtype=np.int64)
+			perceptron["bias_updates"] = np.zeros(tag_weights["bias"].shape, dtype=np.int64)
+		return perceptron
+
+	def perceptron_epoch(self, tag_vectors, perceptron): # runs the perceptron once through the data, returning whether or not it made no mistakes
+		weights = perceptron["weights"]
+		bias = perceptron["bias"]
+		should_predict_tags = perceptron["should_predict_tags"]
+		is_averaged = "weight_updates" in perceptron
+		has_converged = True # it has converged until proven otherwise
+		for test_tag, test_vector in tag_vectors: # run the perceptron through each of the shuffled data vectors for a given token
+			perceptron["step"] += 1
+			# compare the data vector of the given token to the weights of each possible tag for that token: the update is
+			# +1 where it should have predicted the tag but did not, and -1 where it predicted the tag but should not have
+			updates = should_predict_tags[test_tag]-(weights[:, test_vector].sum(axis=1) > bias)
+			if updates.any():
+				has_converged = False
+				bias -= updates
+				weights[:, test_vector] += updates[:, None]
+				if is_averaged:
+					perceptron["bias_updates"] -= updates*perceptron["step"]
+					perceptron["weight_updates"][:, test_vector] += updates[:, None]*perceptron["step"]
+		return has_converged
+
+	def get_perceptron_weights(self, perceptron, columns=slice(None)): # the weights and biases the perceptron would predict with now, for some or all columns
+		if "weight_updates" not in perceptron:
+			return perceptron["weights"][:, columns], perceptron["bias"]
+		steps = perceptron["step"]+1
+		return steps*perceptron["weights"][:, columns].astype(np.int64)-perceptron["weight_updates"][:, columns], steps*perceptron["bias"].astype(np.int64)-perceptron["bias_updates"]
+
+	def end_perceptron_epoch(self, perceptron, held_out_tag_vectors, epoch_stats, start):
+		held_out_correct = 0
+		for test_tag, test_vector in held_out_tag_vectors:
+			weights, bias = self.get_perceptron_weights(perceptron, test_vector)
+			if int(np.argmax(weights.sum(axis=1)-bias)) == test_tag:
+				held_out_correct += 1
+		epoch_stats.append((time.time()-start, held_out_correct, len(held_out_tag_vectors)))
+		if len(held_out_tag_vectors) > 0 and (perceptron["best_weights"] is None or held_out_correct > epoch_stats[perceptron["best_epoch"]][1]):
+			weights, bias = self.get_perceptron_weights(perceptron)
+			perceptron["best_weights"] = (weights.copy(), bias.copy())
+			perceptron["best_epoch"] = len(epoch_stats)-1
+
+	def should_stop_perceptron(self, perceptron, epoch_stats):
+		return perceptron["best_weights"] is not None and len(epoch_stats)-1-perceptron["best_epoch"] >= self.training_patience
+
+	def finish_perceptron(self, perceptron, tag_weights): # sets the weights of every tag to the ones to predict with
+		if perceptron["best_weights"] is not None:
+			tag_weights["weights"], tag_weights["bias"] = perceptron["best_weights"]
+		else:
+			tag_weights["weights"], tag_weights["bias"] = self.get_perceptron_weights(perceptron)
+
+	def get_similarity_scores(self, tag_weights, x): # cosine similarity score of each tag's weights and the feature indices of a window vector, less its bias
+		if tag_weights["weights"] is None:
+			return self.get_sparse_similarity_scores(tag_weights, x)
+		return tag_weights["weights"][:, x].sum(axis=1)-tag_weights["bias"]
+
+	def get_sparse_similarity_scores(self, tag_weights, x): # the same scores from the sparse weights of a binary model, looking up the key of each tag's row and feature index
+		if len(self.sparse_weight_keys) == 0:
+			return np.zeros(len(tag_weights["tags"]), dtype=np.int64)-tag_weights["bias"]
+		keys = tag_weights["row_keys"][:, None]+np.array(x, dtype=np.int64)
+		positions = np.searchsorted(self.sparse_weight_keys, keys)
+		weights = self.sparse_weight_values.take(positions, mode="clip")
+		weights[self.sparse_weight_keys.take(positions, mode="clip") != keys] = 0 # the weights of the features not found are 0
+		return weights.sum(axis=1)-tag_weights["bias"]
@@ -1,16 +1,264 @@
+import collections
+import hashlib
+import heapq
+import math
+import os
+import tempfile
+import threading
+import numpy as np
+import binary_model
+import stream
+
+class SuffixTrie: # a trie of reversed suffixes, finding the longest suffix of a string in time linear in its length
+
+	def __init__(self, suffixes=None):
+		self.root = {} # each node maps a character to its child node, and the empty string to the value of the suffix ending there
+		if suffixes is not None:
+			for suffix in suffixes:
+				self.add(suffix, suffix)
+
+	def add(self, suffix, value):
+		node = self.root
+		for char in reversed(suffix):
+			node = node.setdefault(char, {})
+		node[""] = value
+
+	def get_longest(self, string, default=None): # returns the value of the longest suffix of the string in the trie
+		value = default
+		node = self.root
+		for i in range(len(string)-1, -1, -1):
+			node = node.get(string[i])
+			if node is None:
+				break
+			if "" in node:
+				value = node[""]
+		return value
+
+class LRUCache: # a bounded map that evicts its least recently used entry, safe to share between threads
+
+	def __init__(self, max_size):
+		self.max_size = max_size
+		self.entries = collections.OrderedDict()
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def __getstate__(self): # a copy sent to another process starts empty, since a lock cannot be sent
+		return {"max_size": self.max_size}
+
+	def __setstate__(self, state):
+		self.__init__(state["max_size"])
+
+	def get(self, key): # returns the value of the key, or None if it is not cached
+		with self.lock:
+			value = self.entries.get(key)
+			if value is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+				self.entries.move_to_end(key)
+			return value
+
+	def put(self, key, value):
+		with self.lock:
+			self.entries[key] = value
+			self.entries.move_to_end(key)
+			if len(self.entries) > self.max_size:
+				self.entries.popitem(last=False)
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+
+	def get_stats(self):
+		with self.lock:
+			return {"size": len(self.entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+class CacheCounts: # hit and miss counts added to by many threads
+
+	def __init__(self):
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+
+	def __getstate__(self): # a copy sent to another process starts from zero, since a lock cannot be sent
+		return {}
+
+	def __setstate__(self, state):
+		self.__init__()
+
+	def add(self, hits, misses):
+		with self.lock:
+			self.hits += hits
+			self.misses += misses
+
+	def clear(self):
+		with self.lock:
+			self.hits = 0
+			self.misses = 0
+
+	def get_stats(self):
+		with self.lock:
+			return {"hits": self.hits, "misses": self.misses}
+
+class SentenceCache(dict): # the tag likelihoods of each context within one sentence, used by a single thread
+
+	def __init__(self):
+		super().__init__()
+		self.hits = 0
+		self.misses = 0
+
+class CountsLock: # held while the counts of a model change and while its log likelihoods are built from them
+
+	def __init__(self):
+		self.lock = threading.RLock()
+
+	def __getstate__(self): # a copy sent to another process gets a new lock, since a lock cannot be sent
+		return {}
+
+	def __setstate__(self, state):
+		self.__init__()
+
+	def __enter__(self):
+		return self.lock.__enter__()
+
+	def __exit__(self, *args):
+		return self.lock.__exit__(*args)
+
+class LogLikelihoods: # the log likelihood of every count of a model, built at once and never changed, so a thread tagging with them never sees some tables built from older counts than others
+
+	def __init__(self, model):
+		self.log_likelihoods_by_counts = {} # a single copy of the log likelihoods of each distinct table of counts, shared by all the keys having it, since most rare tokens are seen with the same few tags
+		self.token_as_tag_log_likelihood = self.get_log_likelihood_table(model.token_as_tag_likelihood)
+		self.suffixed_token_as_tag_log_likelihood = self.get_log_likelihood_table(model.suffixed_token_as_tag_likelihood)
+		self.number_token_as_tag_log_likelihood = self.get_log_likelihoods(model.number_token_as_tag_likelihood)
+		self.hyphenated_token_as_tag_log_likelihood = self.get_log_likelihoods(model.hyphenated_token_as_tag_likelihood)
+		self.capitalized_token_as_tag_log_likelihood = self.get_log_likelihoods(model.capitalized_token_as_tag_likelihood)
+		self.unknown_token_as_tag_log_likelihood = self.get_log_likelihoods(model.unknown_token_as_tag_likelihood)
+		self.tag_to_tag_log_likelihood = self.get_log_likelihood_table(model.tag_to_tag_likelihood)
+		self.tag_to_tag_to_tag_log_likelihood = self.get_log_likelihood_table(model.tag_to_tag_to_tag_likelihood)
+		self.suffix_trie = SuffixTrie([suffix for suffix in self.suffixed_token_as_tag_log_likelihood if suffix != "total"]) # the suffixes of the suffixed token counts, indexed to find the longest suffix of an unknown token
+		self.bigram_token_ids = {} # the id of every token of a bigram
+		self.bigram_tag_pair_log_likelihood = {} # the log likelihoods of the tag pairs of each bigram by its first tag, keyed by the ids of its tokens (first token id * bigram token count + second token id)
+		self.bigram_first_tag_log_likelihood = {} # the log likelihoods of the first tags of each bigram, summed over the second tags, keyed the same way
+		self.bigram_counts = {} # the counts of every bigram in the order of the model's table, keyed the same way or by the bigram itself if it is not a pair of tokens, so the table can be built again without its keys being kept as strings
+		self.index_bigrams(model.bigram_tokens_as_tags_likelihood)
+		self.log_likelihoods_by_counts = None
+
+	def index_bigrams(self, bigram_tokens_as_tags_likelihood):
+		for key in bigram_tokens_as_tags_likelihood:
+			bigram_tokens = key.split(" ")
+			if len(bigram_tokens) == 2: # as in the compiled model, a bigram of tokens holding spaces is never looked up
+				for token in bigram_tokens:
+					self.bigram_token_ids.setdefault(token, len(self.bigram_token_ids))
+		token_count = len(self.bigram_token_ids)
+		tags = {} # a single copy of each tag string, shared by all the tables
+		# a single copy of each distinct table, shared by all the bigrams having it, since most bigrams are seen with the same few tags
+		shared_counts = {}
+		shared_log_likelihoods = {}
+		shared_tag_pairs = {}
+		for key in bigram_tokens_as_tags_likelihood:
+			bigram_tags_and_counts = bigram_tokens_as_tags_likelihood[key]
+			counts = tuple(bigram_tags_and_counts.items())
+			counts = shared_counts.setdefault(counts, counts)
+			bigram_tokens = key.split(" ")
+			if len(bigram_tokens) != 2:
+				self.bigram_counts[key] = counts
+				continue
+			total = int(bigram_tags_and_counts["total"])
+			tag_pair_log_likelihood = {}
+			first_tag_counts = {}
+			for bigram_tags in bigram_tags_and_counts:
+				if " " in bigram_tags:
+					prev_tag, tag = [tags.setdefault(tag, tag) for tag in bigram_tags.split(" ")]
+					count = int(bigram_tags_and_counts[bigram_tags])
+					tag_pair_log_likelihood.setdefault(prev_tag, {})[tag] = self.get_log_likelihood(count, total)
+					first_tag_counts[prev_tag] = first_tag_counts.get(prev_tag, 0)+count
+			for prev_tag in tag_pair_log_likelihood:
+				tag_pair_log_likelihood[prev_tag] = shared_log_likelihoods.setdefault(tuple(tag_pair_log_likelihood[prev_tag].items()), tag_pair_log_likelihood[prev_tag])
+			first_tag_log_likelihood = {tag: self.get_log_likelihood(first_tag_counts[tag], total) for tag in first_tag_counts}
+			key = self.bigram_token_ids[bigram_tokens[0]]*token_count+self.bigram_token_ids[bigram_tokens[1]]
+			self.bigram_counts[key] = counts
+			self.bigram_tag_pair_log_likelihood[key] = shared_tag_pairs.setdefault(tuple([(prev_tag, id(tag_pair_log_likelihood[prev_tag])) for prev_tag in tag_pair_log_likelihood]), tag_pair_log_likelihood)
+			self.bigram_first_tag_log_likelihood[key] = shared_log_likelihoods.setdefault(tuple(first_tag_log_likelihood.items()), first_tag_log_likelihood)
+
+	def get_bigram_table(self): # builds the bigram count table of the model again, in the same order
+		tokens = list(self.bigram_token_ids)
+		bigram_tokens_as_tags_likelihood = {}
+		for key in self.bigram_counts:
+			bigram = key
+			if not isinstance(key, str):
+				bigram = "%s %s" % (tokens[key//len(tokens)], tokens[key%len(tokens)])
+			bigram_tokens_as_tags_likelihood[bigram] = dict(self.bigram_counts[key])
+		return bigram_tokens_as_tags_likelihood
+
+	def get_bigram_key(self, first_token, second_token): # the key of a pair of tokens in the bigram tables, or None if either token is in no bigram
+		first_token_id = self.bigram_token_ids.get(first_token)
+		second_token_id = self.bigram_token_ids.get(second_token)
+		if first_token_id is None or second_token_id is None:
+			return None
+		return first_token_id*len(self.bigram_token_ids)+second_token_id
+
+	def get_log_likelihood_table(self, table):
+		log_likelihood_table = {}
+		for key in table:
+			counts = tuple(table[key].items())
+			if counts not in self.log_likelihoods_by_counts:
+				self.log_likelihoods_by_counts[counts] = self.get_log_likelihoods(table[key])
+			log_likelihood_table[key] = self.log_likelihoods_by_counts[counts]
+		return log_likelihood_table
+
+	def get_log_likelihoods(self, tag_and_count_dict): # the log likelihood of every tag of the counts in the same order, negative infinity for a tag counted 0 times
+		total = int(tag_and_count_dict.get("total", 0))
+		log_likelihoods = {}
+		for tag in tag_and_count_dict:
+			if tag != "total":
+				log_likelihoods[tag] = self.get_log_likelihood(int(tag_and_count_dict[tag]), total)
+		return log_likelihoods
+
+	def get_log_likelihood(self, count, total):
+		if count <= 0 or total <= 0:
+			return -math.inf
+		return math.log(count/total)
+
+
 class MM:
 
 	DEFAULT_MODEL_PATH = "mm-model.txt" # the default path of the best model to be used
 	DEFAULT_MIN_TOKEN_OCCURRENCES = 2 # the default minimum amount of occurrences for a token to appear to be considered by the model
 	DEFAULT_MIN_TAG_TO_TOKEN_OCCURRENCES = 100 # the default minimum amount of occurrences for a token to appear with a tag before to be considered by the model
 	DEFAULT_TO_LOWERCASE = False # the default of whether or not to convert all tokens to their lowercase form for the model
+	DEFAULT_DECODER = "lookahead" # the default decoder, either "lookahead" (greedy with a two token lookahead), "viterbi" (dynamic programming over tag pairs) or "beam" (the best beam_width tag histories)
+	DEFAULT_BEAM_WIDTH = 4 # the default number of tag histories kept at each token by the beam decoder
+	DEFAULT_BATCH_SIZE = 256 # the default number of sentences scored together when tagging a batch
+	DEFAULT_MAX_COUNTS_IN_MEMORY = 1000000 # the default number of token and bigram counts held in memory while training from a stream
+	DEFAULT_CACHE_SIZE = 100000 # the default number of unknown tokens cached, 0 for no caching of unknown tokens or of contexts within a sentence
 	SMOOTHING_SUFFIXES = ["acy", "al", "ance", "ence", "dom", "er", "or", "ism", "ist", "ity", "ty", "ment", "ness", "ship", "ation", "ition", "sion", "tion", "ion", "ate", "en", "ify", "fy", "ize", "ise", "able", "ible", "ial", "esque", "ful", "ic", "ical", "ious", "eous", "ous", "ish", "ative", "itive", "ive", "less", "ing", "est", "ly", "y", "ed", "es", "s"] # suffixes to check for in the training set to be used for unknown words with the same suffix in testing
+	SMOOTHING_SUFFIX_TRIE = SuffixTrie(SMOOTHING_SUFFIXES) # the smoothing suffixes indexed so the longest one of a token is found at once
+	NO_TAG_LOG_LIKELIHOODS = {"": 0.0} # the log likelihoods of a token without any known tags, which gets an empty tag that neither adds to nor takes from the score of the sentence, as in the compiled model
 	
-	def __init__(self, model_path=DEFAULT_MODEL_PATH):
+	INSTRUMENTED_TAGGING_METHODS = ["get_pos_tags", "get_pos_tags_batch"] # the methods that tag sentences, each call of which is recorded when instrumented
+	INSTRUMENTED_METHODS = ["get_pos_tags_viterbi", "get_pos_tags_beam", "get_pos_tag_log_likelihoods_for_token", "compute_pos_tag_log_likelihoods_for_token", "get_token_log_likelihood_factors", "get_tag_log_likelihoods", "compute_unknown_token_features", "get_tie_breaker_log_likelihoods"] # the methods counted and timed when instrumented
+	COUNT_SECTIONS = ["TOKEN", "SUFFIX", "NUMBER", "HYPHEN", "CAPITALIZED", "UNKNOWN", "TAG", "TRAG", "BIGRAM"] # the sections of counts in a model file, in the order they are saved
+	COUNT_TABLES = ["token_as_tag_likelihood", "suffixed_token_as_tag_likelihood", "number_token_as_tag_likelihood", "hyphenated_token_as_tag_likelihood", "capitalized_token_as_tag_likelihood", "unknown_token_as_tag_likelihood", "tag_to_tag_likelihood", "tag_to_tag_to_tag_likelihood", "bigram_tokens_as_tags_likelihood"] # the count table of each section
+
+	def __init__(self, model_path=DEFAULT_MODEL_PATH, cache_size=DEFAULT_CACHE_SIZE, instrumentation=None):
+		self.instrumentation = instrumentation # counts and times the tagging of every sentence, if given
+		if self.instrumentation is not None:
+			self.instrumentation.instrument(self, self.INSTRUMENTED_TAGGING_METHODS, self.INSTRUMENTED_METHODS)
+		self.unknown_token_cache = None # the suffix counts, log likelihoods and features of each unknown token
+		self.context_counts = None # the hits and misses of the tag likelihoods cached for each context within a sentence
+		if cache_size > 0:
+			self.unknown_token_cache = LRUCache(cache_size)
+			self.context_counts = CacheCounts()
+		self.counts_lock = CountsLock() # keeps the log likelihoods from being built from counts being updated
 		self.reset_vars()
 		if model_path is not None:
-			with open(model_path) as model:
-				self.load_model(model)
+			if binary_model.is_binary_model(model_path):
+				self.load_binary_model(model_path)
+			else:
+				with open(model_path) as model:
+					self.load_model(model)
 
 	def reset_vars(self):
 		self.token_as_tag_likelihood = {} # the counts of occurrences of all tags of which a token is seen
@@ -22,6 +270,87 @@ class MM:
 		self.tag_to_tag_likelihood = {} # the counts of tags following a given tag
 		self.tag_to_tag_to_tag_likelihood = {} # the counts of tags following a given tag following a given tag
 		self.bigram_tokens_as_tags_likelihood = {} # the counts of occurrences of all tags of which a bigram is seen
+		self.compiled_model = None # the array-backed form of the model built by compile()
+		self.binary_counts = None # the values and arrays of a binary model, whose counts are only read into the count tables once they are needed
+		self.counts = None # the unpruned counts the model was built from, kept only to update the model with new data
+		self.counts_minimum = self.DEFAULT_MIN_TOKEN_OCCURRENCES # the minimum the model was pruned with from the unpruned counts
+		self.counts_to_lowercase = self.DEFAULT_TO_LOWERCASE # whether or not the unpruned counts were made from lowercase tokens
+		self.clear_caches()
+
+	def __getattr__(self, name): # the count tables of a binary model are read from its file the first time they are used, and the bigram table is built again from its log likelihoods
+		if name in self.COUNT_TABLES and self.__dict__.get("binary_counts") is not None:
+			self.load_binary_counts()
+			return getattr(self, name)
+		if name == "bigram_tokens_as_tags_likelihood" and self.__dict__.get("log_likelihoods") is not None:
+			self.load_bigram_counts()
+			return getattr(self, name)
+		raise AttributeError(name)
+
+	def load_bigram_counts(self):
+		with self.counts_lock:
+			if "bigram_tokens_as_tags_likelihood" not in self.__dict__: # not built by another thread while this one waited
+				self.bigram_tokens_as_tags_likelihood = self.log_likelihoods.get_bigram_table()
+
+	def clear_caches(self): # the cached likelihoods are only valid for the tables they were computed from
+		if self.unknown_token_cache is not None:
+			self.unknown_token_cache.clear()
+		if self.__dict__.get("log_likelihoods") is not None and "bigram_tokens_as_tags_likelihood" not in self.__dict__:
+			self.load_bigram_counts() # the bigram table is only kept by the log likelihoods
+		self.log_likelihoods = None # the log likelihoods of the count tables, built again the next time a sentence is tagged
+		if self.__dict__.get("binary_counts") is None: # the counts of a binary model cannot have changed before they are read
+			self.compiled_model = None # compiled from the old counts, so compiled again the next time it is needed
+
+	def get_log_likelihood_tables(self): # the log likelihoods of the count tables, built the first time they are needed after the counts change
+		log_likelihoods = self.log_likelihoods
+		if log_likelihoods is None:
+			with self.counts_lock:
+				log_likelihoods = self.log_likelihoods
+				if log_likelihoods is None: # not built by another thread while this one waited
+					log_likelihoods = LogLikelihoods(self)
+					self.log_likelihoods = log_likelihoods # every table is published at once
+					# tagging only uses the bigram tables of the log likelihoods, which keep the counts to build the bigram table
+					# again when the model is trained, updated, saved or compiled, so it is not also kept with its keys as strings
+					del self.bigram_tokens_as_tags_likelihood
+		return log_likelihoods
+
+	def get_cache_stats(self):
+		if self.unknown_token_cache is None:
+			return {}
+		return {"unknown_token": self.unknown_token_cache.get_stats(), "context": self.context_counts.get_stats()}
+
+	def get_instrumentation_stats(self):
+		if self.instrumentation is None:
+			return {}
+		return self.instrumentation.get_stats()
+
+	def count_unknown_tokens(self, sentence, to_lowercase=DEFAULT_TO_LOWERCASE):
+		return sum(self.find_unknown_tokens(sentence, to_lowercase=to_lowercase))
+
+	def find_unknown_tokens(self, sentence, to_lowercase=DEFAULT_TO_LOWERCASE): # whether or not each token is unknown to the model
+		unknown_tokens = []
+		for token in sentence:
+			if to_lowercase:
+				token = token.lower()
+			if self.binary_counts is not None:
+				unknown_tokens.append(self.compiled_model.get_lexical_row(token)[1])
+			else:
+				unknown_tokens.append(token not in self.token_as_tag_likelihood)
+		return unknown_tokens
+
+	def get_table_sizes(self): # the number of keys in each table of counts, and the bytes of the compiled arrays
+		binary_counts = self.binary_counts
+		if binary_counts is not None: # saved with a binary model, so its counts are not read just to be counted
+			table_sizes = dict(binary_counts[0]["count_table_sizes"])
+		else:
+			log_likelihoods = self.log_likelihoods
+			if log_likelihoods is not None and "bigram_tokens_as_tags_likelihood" not in self.__dict__:
+				bigram_count = len(log_likelihoods.bigram_counts) # the bigram table is not built again just to be counted
+			else:
+				bigram_count = len(self.bigram_tokens_as_tags_likelihood)
+			table_sizes = {"token": len(self.token_as_tag_likelihood), "suffix": len(self.suffixed_token_as_tag_likelihood), "unknown": len(self.unknown_token_as_tag_likelihood), "tag": len(self.tag_to_tag_likelihood), "trag": len(self.tag_to_tag_to_tag_likelihood), "bigram": bigram_count}
+		if self.compiled_model is not None:
+			table_sizes["compiled_bytes"] = sum([getattr(self.compiled_model, name).nbytes for name in self.compiled_model.BINARY_ARRAYS])
+		return table_sizes
 
 	def load_model(self, model):
 		IS_TOKEN = 1
@@ -102,8 +431,57 @@ class MM:
 							self.unknown_token_as_tag_likelihood = tag_and_count_dict
 						elif current_state == IS_TAG:
 							self.tag_to_tag_likelihood[current_key] = tag_and_count_dict
+		self.clear_caches()
+
+	def load_binary_model(self, model_path):
+		# only the compiled arrays are loaded, used in place from the memory map to tag. the counts behind them are read into
+		# the count tables the first time they are used, to train, update or save the model or to tag with the beam decoder
+		values, arrays = binary_model.read_binary_model(model_path, "MM")
+		self.reset_vars()
+		self.compiled_model = CompiledMM()
+		self.compiled_model.load_binary_arrays(values, arrays)
+		for name in self.COUNT_TABLES:
+			delattr(self, name)
+		self.binary_counts = (values, arrays)
+
+	def load_binary_counts(self):
+		with self.counts_lock:
+			if self.binary_counts is None: # read by another thread while this one waited
+				return
+			values, arrays = self.binary_counts
+			arrays = binary_model.unpack_arrays(values["count_arrays"], arrays["count_data"])
+			row_keys = binary_model.decode_strings(arrays["count_row_keys"], values["count_row_count"])
+			columns = binary_model.decode_strings(arrays["count_columns"], values["count_column_count"])
+			row_sections = arrays["count_row_sections"].tolist()
+			offsets = arrays["count_offsets"].tolist()
+			column_ids = arrays["count_column_ids"].tolist()
+			counts = arrays["count_values"].tolist()
+			tables = [{} for section in self.COUNT_SECTIONS]
+			for i, key in enumerate(row_keys):
+				tag_and_count_dict = {}
+				for j in range(offsets[i], offsets[i+1]):
+					tag_and_count_dict[columns[column_ids[j]]] = counts[j]
+				section = row_sections[i]
+				if self.COUNT_SECTIONS[section] in ["NUMBER", "HYPHEN", "CAPITALIZED", "UNKNOWN"]: # a section of a single row is the row itself
+					tables[section] = tag_and_count_dict
+				else:
+					tables[section][key] = tag_and_count_dict
+			for name, table in zip(self.COUNT_TABLES, tables):
+				setattr(self, name, table)
+			self.binary_counts = None # set last, so the model tags with the compiled arrays until every table is read
 
-	def get_pos_tags(self, sentence, to_lowercase=DEFAULT_TO_LOWERCASE):
+	def get_pos_tags(self, sentence, to_lowercase=DEFAULT_TO_LOWERCASE, decoder=DEFAULT_DECODER, beam_width=DEFAULT_BEAM_WIDTH):
+		if self.binary_counts is not None and decoder != "beam": # a binary model tags with the compiled arrays it maps, which give the same tags
+			return self.compiled_model.get_pos_tags(sentence, to_lowercase=to_lowercase, decoder=decoder)
+		if decoder == "viterbi":
+			return self.get_pos_tags_viterbi(sentence, to_lowercase=to_lowercase)[0]
+		elif decoder == "beam":
+			return self.get_pos_tags_beam(sentence, to_lowercase=to_lowercase, beam_width=beam_width)
+		elif decoder != "lookahead":
+			raise ValueError("unknown decoder: %s" % decoder)
+		sentence_cache = None # the lookahead scores the same contexts many times within a sentence
+		if self.context_counts is not None:
+			sentence_cache = SentenceCache()
 		tag_predictions = [] # return array
 		for i, token in enumerate(sentence):
 			prev_tag_prediction = None
@@ -118,221 +496,424 @@ class MM:
 			next_token = None
 			if i+1 < len(sentence):
 				next_token = sentence[i+1]
-			highest_probability = float(0)
+			highest_log_likelihood = -math.inf
 			tag_prediction = ""
-			tag_likelihoods = self.get_pos_tag_likelihoods_for_token(token, prev_token, next_token, prev_tag_prediction, two_prev_tag_prediction, to_lowercase=to_lowercase)
-			for tag in tag_likelihoods:
-				tag_likelihood = tag_likelihoods[tag]
+			tag_log_likelihoods = self.get_pos_tag_log_likelihoods_for_token(token, prev_token, next_token, prev_tag_prediction, two_prev_tag_prediction, to_lowercase=to_lowercase, sentence_cache=sentence_cache)
+			for tag in tag_log_likelihoods:
+				tag_log_likelihood = tag_log_likelihoods[tag]
 				if i+1 < len(sentence):
 					next_token = sentence[i+1]
 					third_token = None
 					if i+2 < len(sentence):
 						third_token = sentence[i+2]
-					next_tag_likelihoods = self.get_pos_tag_likelihoods_for_token(next_token, token, third_token, tag, prev_tag_prediction, to_lowercase=to_lowercase)
-					for next_tag in next_tag_likelihoods:
-						next_tag_likelihood = next_tag_likelihoods[next_tag]
+					next_tag_log_likelihoods = self.get_pos_tag_log_likelihoods_for_token(next_token, token, third_token, tag, prev_tag_prediction, to_lowercase=to_lowercase, sentence_cache=sentence_cache)
+					for next_tag in next_tag_log_likelihoods:
+						next_tag_log_likelihood = next_tag_log_likelihoods[next_tag]
 						if i+2 < len(sentence):
 							third_token = sentence[i+2]
 							fourth_token = None
 							if i+3 < len(sentence):
 								fourth_token = sentence[i+3]
-							third_tag_likelihoods = self.get_pos_tag_likelihoods_for_token(third_token, next_token, fourth_token, next_tag, tag, to_lowercase=to_lowercase)
-							for third_tag in third_tag_likelihoods:
-								third_tag_likelihood = third_tag_likelihoods[third_tag]
-								if third_tag_likelihood*next_tag_likelihood*tag_likelihood >= highest_probability:
-									highest_probability = third_tag_likelihood*next_tag_likelihood*tag_likelihood
+							third_tag_log_likelihoods = self.get_pos_tag_log_likelihoods_for_token(third_token, next_token, fourth_token, next_tag, tag, to_lowercase=to_lowercase, sentence_cache=sentence_cache)
+							for third_tag in third_tag_log_likelihoods:
+								third_tag_log_likelihood = third_tag_log_likelihoods[third_tag]
+								if third_tag_log_likelihood+next_tag_log_likelihood+tag_log_likelihood >= highest_log_likelihood:
+									highest_log_likelihood = third_tag_log_likelihood+next_tag_log_likelihood+tag_log_likelihood
 									tag_prediction = tag
-						elif next_tag_likelihood*tag_likelihood >= highest_probability:
-							highest_probability = next_tag_likelihood*tag_likelihood
+						elif next_tag_log_likelihood+tag_log_likelihood >= highest_log_likelihood:
+							highest_log_likelihood = next_tag_log_likelihood+tag_log_likelihood
 							tag_prediction = tag
-				elif tag_likelihood >= highest_probability:
-					highest_probability = tag_likelihood
+				elif tag_log_likelihood >= highest_log_likelihood:
+					highest_log_likelihood = tag_log_likelihood
 					tag_prediction = tag
 			tag_predictions.append(tag_prediction) # add the prediction to the return array
+		if sentence_cache is not None:
+			self.context_counts.add(sentence_cache.hits, sentence_cache.misses)
 		return tag_predictions
 
-	def get_pos_tag_likelihoods_for_token(self, token, prev_token, next_token, prev_tag, two_prev_tag, to_lowercase=DEFAULT_TO_LOWERCASE):
-		pos_tag_likelihoods = {}
+	def get_pos_tags_viterbi(self, sentence, to_lowercase=DEFAULT_TO_LOWERCASE):
+		if self.binary_counts is not None:
+			return self.compiled_model.get_pos_tags_viterbi(sentence, to_lowercase=to_lowercase)
+		# each state is a (previous tag, tag) pair holding the best log score of reaching it and the tag before the pair
+		states = {(None, None): (0.0, None)}
+		history = [] # the states of every position, used to trace back the best tag sequence
+		for i, token in enumerate(sentence):
+			prev_token = None
+			if i > 0:
+				prev_token = sentence[i-1]
+			next_token = None
+			if i+1 < len(sentence):
+				next_token = sentence[i+1]
+			token_log_likelihood_factors = self.get_token_log_likelihood_factors(token, prev_token, next_token, to_lowercase) # the same for every state
+			candidate_tags = list(token_log_likelihood_factors[1])
+			if len(candidate_tags) == 0: # the token has no known tags, so keep the sequence going with an empty tag
+				candidate_tags = [""]
+			next_states = {}
+			for (two_prev_tag, prev_tag), (score, _) in states.items():
+				if score == -math.inf: # every state following a state of log score negative infinity has it too, so its tags are not scored
+					for tag in candidate_tags:
+						if (prev_tag, tag) not in next_states:
+							next_states[(prev_tag, tag)] = (score, two_prev_tag)
+					continue
+				tag_log_likelihoods = self.get_tag_log_likelihoods(token_log_likelihood_factors, prev_tag, two_prev_tag)
+				for tag in candidate_tags:
+					current_score = score+tag_log_likelihoods.get(tag, -math.inf)
+					state = (prev_tag, tag)
+					if state not in next_states or current_score > next_states[state][0]:
+						next_states[state] = (current_score, two_prev_tag)
+			history.append(next_states)
+			states = next_states
+		if len(history) == 0:
+			return [], 0.0
+		# trace back from the best final state
+		best_state = None
+		best_score = float("-inf")
+		for state, (score, _) in states.items():
+			if best_state is None or score > best_score:
+				best_state = state
+				best_score = score
+		tag_predictions = [best_state[1]]
+		prev_tag, tag = best_state
+		i = len(history)-1
+		while i > 0:
+			two_prev_tag = history[i][(prev_tag, tag)][1]
+			tag_predictions.append(prev_tag)
+			prev_tag, tag = two_prev_tag, prev_tag
+			i -= 1
+		tag_predictions.reverse()
+		return tag_predictions, best_score
+
+	def get_pos_tags_beam(self, sentence, to_lowercase=DEFAULT_TO_LOWERCASE, beam_width=DEFAULT_BEAM_WIDTH):
+		# each hypothesis is the log score of a tag history and the history, kept as its last tag and the history before it.
+		# only the best hypothesis ending in each (previous tag, tag) pair is kept, so a beam at least as wide as the number
+		# of pairs finds tags scoring the same as those found by viterbi
+		if beam_width < 1:
+			raise ValueError("the beam width must be at least 1")
+		beam = [(0.0, None)]
+		for i, token in enumerate(sentence):
+			prev_token = None
+			if i > 0:
+				prev_token = sentence[i-1]
+			next_token = None
+			if i+1 < len(sentence):
+				next_token = sentence[i+1]
+			token_log_likelihood_factors = self.get_token_log_likelihood_factors(token, prev_token, next_token, to_lowercase) # the same for every hypothesis
+			candidate_tags = list(token_log_likelihood_factors[1])
+			if len(candidate_tags) == 0: # the token has no known tags, so keep the histories going with an empty tag
+				candidate_tags = [""]
+			best_hypotheses = {} # the best hypothesis ending in each (previous tag, tag) pair
+			for score, history in beam:
+				prev_tag = None
+				two_prev_tag = None
+				if history is not None:
+					prev_tag = history[0]
+					if history[1] is not None:
+						two_prev_tag = history[1][0]
+				tag_log_likelihoods = self.get_tag_log_likelihoods(token_log_likelihood_factors, prev_tag, two_prev_tag)
+				for tag in candidate_tags:
+					current_score = score+tag_log_likelihoods.get(tag, -math.inf)
+					state = (prev_tag, tag)
+					if state not in best_hypotheses or current_score > best_hypotheses[state][0]:
+						best_hypotheses[state] = (current_score, (tag, history))
+			beam = heapq.nlargest(beam_width, best_hypotheses.values(), key=lambda hypothesis: hypothesis[0])
+		tag_predictions = []
+		history = beam[0][1]
+		while history is not None:
+			tag_predictions.append(history[0])
+			history = history[1]
+		tag_predictions.reverse()
+		return tag_predictions
+
+	def get_pos_tags_batch(self, sentences, to_lowercase=DEFAULT_TO_LOWERCASE, decoder=DEFAULT_DECODER, batch_size=DEFAULT_BATCH_SIZE, beam_width=DEFAULT_BEAM_WIDTH): # tags many sentences at once with the compiled model
+		if decoder == "beam": # the compiled model has no beam decoder, so each sentence is tagged on its own
+			return [self.get_pos_tags_beam(sentence, to_lowercase=to_lowercase, beam_width=beam_width) for sentence in sentences]
+		if self.compiled_model is None:
+			self.compile()
+		return self.compiled_model.get_pos_tags_batch(sentences, to_lowercase=to_lowercase, decoder=decoder, batch_size=batch_size)
+
+	def tag_stream(self, lines, to_lowercase=DEFAULT_TO_LOWERCASE, decoder=DEFAULT_DECODER, beam_width=DEFAULT_BEAM_WIDTH, tagged=None): # yields the (token, tag) pairs of each sentence of lines of tokens as soon as the blank line ending it is read
+		return stream.tag_stream(self, lines, to_lowercase=to_lowercase, tagged=tagged, decoder=decoder, beam_width=beam_width)
+
+	def get_token_features(self, token, log_likelihoods=None): # returns the tag counts used for a token, whether or not it is unknown, whether or not it is an unknown number, hyphenated or capitalized token, and the log likelihoods of its tags
+		if log_likelihoods is None:
+			log_likelihoods = self.get_log_likelihood_tables()
+		token_as_tag_log_likelihood = log_likelihoods.token_as_tag_log_likelihood.get(token)
+		if token_as_tag_log_likelihood is not None:
+			return self.token_as_tag_likelihood.get(token), False, False, False, False, token_as_tag_log_likelihood
+		if self.unknown_token_cache is None:
+			return self.compute_unknown_token_features(token, log_likelihoods)
+		cached_token_features = self.unknown_token_cache.get(token) # the log likelihoods the features were computed from, and the features
+		if cached_token_features is not None and cached_token_features[0] is log_likelihoods:
+			return cached_token_features[1]
+		token_features = self.compute_unknown_token_features(token, log_likelihoods)
+		self.unknown_token_cache.put(token, (log_likelihoods, token_features))
+		return token_features
+
+	def compute_unknown_token_features(self, token, log_likelihoods):
+		suffix = log_likelihoods.suffix_trie.get_longest(token) # the longest suffix, so a smaller subsuffix of it is never used
+		token_as_tag_likelihood = self.unknown_token_as_tag_likelihood
+		token_as_tag_log_likelihood = log_likelihoods.unknown_token_as_tag_log_likelihood
+		if suffix is not None:
+			token_as_tag_likelihood = self.suffixed_token_as_tag_likelihood.get(suffix)
+			token_as_tag_log_likelihood = log_likelihoods.suffixed_token_as_tag_log_likelihood[suffix]
+		return token_as_tag_likelihood, True, self.is_number(token), "-" in token, token[:1].isupper(), token_as_tag_log_likelihood
+
+	def get_pos_tag_log_likelihoods_for_token(self, token, prev_token, next_token, prev_tag, two_prev_tag, to_lowercase=DEFAULT_TO_LOWERCASE, sentence_cache=None): # the returned log likelihoods may be shared through the cache, so they must not be changed
+		if sentence_cache is None:
+			return self.compute_pos_tag_log_likelihoods_for_token(token, prev_token, next_token, prev_tag, two_prev_tag, to_lowercase)
+		key = (token, prev_token, next_token, prev_tag, two_prev_tag)
+		pos_tag_log_likelihoods = sentence_cache.get(key)
+		if pos_tag_log_likelihoods is None:
+			sentence_cache.misses += 1
+			pos_tag_log_likelihoods = self.compute_pos_tag_log_likelihoods_for_token(token, prev_token, next_token, prev_tag, two_prev_tag, to_lowercase)
+			sentence_cache[key] = pos_tag_log_likelihoods
+		else:
+			sentence_cache.hits += 1
+		return pos_tag_log_likelihoods
+
+	def compute_pos_tag_log_likelihoods_for_token(self, token, prev_token, next_token, prev_tag, two_prev_tag, to_lowercase):
+		return self.get_tag_log_likelihoods(self.get_token_log_likelihood_factors(token, prev_token, next_token, to_lowercase), prev_tag, two_prev_tag)
+
+	def get_token_log_likelihood_factors(self, token, prev_token, next_token, to_lowercase):
+		# the log likelihoods of a token that do not depend on the tags before it: its tag log likelihoods, those of its unknown
+		# number, hyphenated and capitalized features, the tag pairs of its bigram with the previous token, and the first tags
+		# of its bigram with the next token. the decoders scoring many previous tags at a position compute these only once
 		if to_lowercase:
 			token = token.lower()
-		is_unknown = False
-		current_token_as_tag_likelihood = {}
-		if token not in self.token_as_tag_likelihood:
-			has_suffix = False
-			for suffix in self.suffixed_token_as_tag_likelihood:
-				if suffix != "total" and token.endswith(suffix):
-					has_suffix = True
-					current_token_as_tag_likelihood = self.suffixed_token_as_tag_likelihood[suffix]
-					break # as soon as the suffix is found stop searching to save time and avoid using a smaller subsuffix of the found suffix
-			if has_suffix is False:
-				current_token_as_tag_likelihood = self.unknown_token_as_tag_likelihood
-			is_unknown = True
-		else:
-			current_token_as_tag_likelihood = self.token_as_tag_likelihood[token]
-		token_total = int(current_token_as_tag_likelihood["total"])
-		for tag in current_token_as_tag_likelihood:
-			if tag != "total":
-				current_probability = float(int(current_token_as_tag_likelihood[tag])/token_total)
-				if prev_tag is not None and len(prev_tag) > 0:
-					if two_prev_tag is not None and len(two_prev_tag) > 0 and "%s %s" % (two_prev_tag, prev_tag) in self.tag_to_tag_to_tag_likelihood:
-						prev_tags = "%s %s" % (two_prev_tag, prev_tag)
-						prev_tags_total = int(self.tag_to_tag_to_tag_likelihood[prev_tags]["total"])
-						if tag in self.tag_to_tag_to_tag_likelihood[prev_tags]:
-							current_probability *= float(int(self.tag_to_tag_to_tag_likelihood[prev_tags][tag])/prev_tags_total)
-						else:
-							current_probability = 0
-					else:
-						prev_tag_total = int(self.tag_to_tag_likelihood[prev_tag]["total"])
-						if tag in self.tag_to_tag_likelihood[prev_tag]:
-							current_probability *= float(int(self.tag_to_tag_likelihood[prev_tag][tag])/prev_tag_total)
-						else:
-							current_probability = 0
-					# if the word is unknown but contains a number, the number probabilities should be considered
-					if is_unknown and self.is_number(token):
-						if tag in self.number_token_as_tag_likelihood:
-							current_probability *= float(int(self.number_token_as_tag_likelihood[tag])/int(self.number_token_as_tag_likelihood["total"]))
-						else:
-							current_probability = 0
-					# if the word is unknown but contains a hyphen, the hyphenated probabilities should be considered
-					if is_unknown and "-" in token:
-						if tag in self.hyphenated_token_as_tag_likelihood:
-							current_probability *= float(int(self.hyphenated_token_as_tag_likelihood[tag])/int(self.hyphenated_token_as_tag_likelihood["total"]))
-						else:
-							current_probability = 0
-					# if the word is unknown but starts with a capital, the capital probabilities should be considered
-					if is_unknown and token[0].isupper():
-						if tag in self.capitalized_token_as_tag_likelihood:
-							current_probability *= float(int(self.capitalized_token_as_tag_likelihood[tag])/int(self.capitalized_token_as_tag_likelihood["total"]))
-						else:
-							current_probability = 0
-				# check if the previous token and current token form a known bigram
-				if prev_token is not None and len(prev_token) > 0 and prev_tag is not None and len(prev_tag) > 0:
-					bigram_tokens = "%s %s" % (prev_token, token)
-					if bigram_tokens in self.bigram_tokens_as_tags_likelihood:
-						bigram_tokens_total = int(self.bigram_tokens_as_tags_likelihood[bigram_tokens]["total"])
-						bigram_tags = "%s %s" % (prev_tag, tag)
-						if bigram_tags in self.bigram_tokens_as_tags_likelihood[bigram_tokens]:
-							current_probability *= float(int(self.bigram_tokens_as_tags_likelihood[bigram_tokens][bigram_tags])/int(bigram_tokens_total))
-						else:
-							current_probability = 0
-				# check if the token and the next token form a known bigram
-				if next_token is not None and len(next_token) > 0:
-					bigram_tokens = "%s %s" % (token, next_token)
-					if bigram_tokens in self.bigram_tokens_as_tags_likelihood:
-						bigram_tokens_total = int(self.bigram_tokens_as_tags_likelihood[bigram_tokens]["total"])
-						bigram_first_tag_same_total = 0
-						for bigram_tags in self.bigram_tokens_as_tags_likelihood[bigram_tokens]: # since the next token tag is unknown, check all of the tag bigrams where the first tag is the checked tag
-							if " " in bigram_tags:
-								first_tag = bigram_tags.split(" ")[0].strip()
-								if first_tag == tag:
-									bigram_first_tag_same_total += self.bigram_tokens_as_tags_likelihood[bigram_tokens][bigram_tags]
-						if bigram_first_tag_same_total > 0:
-							current_probability *= float(int(bigram_first_tag_same_total)/int(bigram_tokens_total))
-						else:
-							current_probability = 0
-				if current_probability > 0:
-					pos_tag_likelihoods[tag] = current_probability
-		if len(pos_tag_likelihoods) == 0:
-			for tag in current_token_as_tag_likelihood: # if all the tag likelihoods were reset to 0, figure out a tie-breaker
-				if tag != "total":
-					current_probability = float(int(current_token_as_tag_likelihood[tag])/int(current_token_as_tag_likelihood["total"]))
-					if prev_tag is not None and len(prev_tag) > 0:
-						prev_tag_total = int(self.tag_to_tag_likelihood[prev_tag]["total"])
-						if tag in self.tag_to_tag_likelihood[prev_tag]:
-							current_probability *= float(int(self.tag_to_tag_likelihood[prev_tag][tag])/prev_tag_total)
-						else:
-							current_probability = 0
-					pos_tag_likelihoods[tag] = current_probability
-		return pos_tag_likelihoods
+		log_likelihoods = self.get_log_likelihood_tables() # the same tables for every factor, even if the counts are updated meanwhile
+		_, is_unknown, is_number, is_hyphenated, is_capitalized, current_token_as_tag_log_likelihood = self.get_token_features(token, log_likelihoods)
+		feature_log_likelihoods = []
+		# if the word is unknown but contains a number, the number probabilities should be considered
+		if is_number:
+			feature_log_likelihoods.append(log_likelihoods.number_token_as_tag_log_likelihood)
+		# if the word is unknown but contains a hyphen, the hyphenated probabilities should be considered
+		if is_hyphenated:
+			feature_log_likelihoods.append(log_likelihoods.hyphenated_token_as_tag_log_likelihood)
+		# if the word is unknown but starts with a capital, the capital probabilities should be considered
+		if is_capitalized:
+			feature_log_likelihoods.append(log_likelihoods.capitalized_token_as_tag_log_likelihood)
+		# check if the previous token and current token form a known bigram
+		prev_bigram_tag_pair_log_likelihood = None
+		if prev_token is not None and len(prev_token) > 0:
+			prev_bigram_tag_pair_log_likelihood = log_likelihoods.bigram_tag_pair_log_likelihood.get(log_likelihoods.get_bigram_key(prev_token, token))
+		# check if the token and the next token form a known bigram, since the next token tag is unknown the likelihood of the tag is summed over all of the next tags
+		next_bigram_log_likelihood = None
+		if next_token is not None and len(next_token) > 0:
+			next_bigram_log_likelihood = log_likelihoods.bigram_first_tag_log_likelihood.get(log_likelihoods.get_bigram_key(token, next_token))
+		return log_likelihoods, current_token_as_tag_log_likelihood, feature_log_likelihoods, prev_bigram_tag_pair_log_likelihood, next_bigram_log_likelihood
+
+	def get_tag_log_likelihoods(self, token_log_likelihood_factors, prev_tag, two_prev_tag):
+		# the log likelihoods are added in the same order as the compiled model adds them, and a tag with a likelihood of 0 is dropped
+		log_likelihoods, current_token_as_tag_log_likelihood, feature_log_likelihoods, prev_bigram_tag_pair_log_likelihood, next_bigram_log_likelihood = token_log_likelihood_factors
+		pos_tag_log_likelihoods = {}
+		has_prev_tag = prev_tag is not None and len(prev_tag) > 0
+		transition_log_likelihood = None # the log likelihoods of the tags following the previous tags
+		prev_bigram_log_likelihood = None # the log likelihoods of the tags following the previous tag in the bigram
+		if has_prev_tag:
+			if two_prev_tag is not None and len(two_prev_tag) > 0 and "%s %s" % (two_prev_tag, prev_tag) in log_likelihoods.tag_to_tag_to_tag_log_likelihood:
+				transition_log_likelihood = log_likelihoods.tag_to_tag_to_tag_log_likelihood["%s %s" % (two_prev_tag, prev_tag)]
+			else:
+				transition_log_likelihood = log_likelihoods.tag_to_tag_log_likelihood[prev_tag]
+			if prev_bigram_tag_pair_log_likelihood is not None:
+				prev_bigram_log_likelihood = prev_bigram_tag_pair_log_likelihood.get(prev_tag, {})
+		for tag in current_token_as_tag_log_likelihood:
+			current_log_likelihood = current_token_as_tag_log_likelihood[tag]
+			if has_prev_tag:
+				current_log_likelihood += transition_log_likelihood.get(tag, -math.inf)
+				for feature_log_likelihood in feature_log_likelihoods:
+					current_log_likelihood += feature_log_likelihood.get(tag, -math.inf)
+			if prev_bigram_log_likelihood is not None:
+				current_log_likelihood += prev_bigram_log_likelihood.get(tag, -math.inf)
+			if next_bigram_log_likelihood is not None:
+				current_log_likelihood += next_bigram_log_likelihood.get(tag, -math.inf)
+			if current_log_likelihood > -math.inf:
+				pos_tag_log_likelihoods[tag] = current_log_likelihood
+		if len(current_token_as_tag_log_likelihood) == 0:
+			return self.NO_TAG_LOG_LIKELIHOODS
+		if len(pos_tag_log_likelihoods) == 0: # if all the tag likelihoods were 0, figure out a tie-breaker
+			pos_tag_log_likelihoods = self.get_tie_breaker_log_likelihoods(current_token_as_tag_log_likelihood, prev_tag, log_likelihoods)
+		return pos_tag_log_likelihoods
+
+	def get_tie_breaker_log_likelihoods(self, current_token_as_tag_log_likelihood, prev_tag, log_likelihoods): # the log likelihoods of the tags of a token from only its tag counts and the previous tag
+		if prev_tag is None or len(prev_tag) == 0:
+			return current_token_as_tag_log_likelihood
+		pos_tag_log_likelihoods = {}
+		for tag in current_token_as_tag_log_likelihood:
+			pos_tag_log_likelihoods[tag] = current_token_as_tag_log_likelihood[tag]+log_likelihoods.tag_to_tag_log_likelihood[prev_tag].get(tag, -math.inf)
+		return pos_tag_log_likelihoods
+
+	def compile(self): # build the array-backed form of the model for faster tagging
+		self.compiled_model = CompiledMM(self)
+		return self.compiled_model
+
+	# development function
+	def set_model(self, data, minimum=DEFAULT_MIN_TOKEN_OCCURRENCES, to_lowercase=DEFAULT_TO_LOWERCASE, keep_counts=False):
+		self.set_counts(data, to_lowercase=to_lowercase)
+		if keep_counts:
+			counts = MM(model_path=None)
+			counts.merge_counts(self)
+		self.prune(minimum)
+		if keep_counts:
+			self.set_counts_model(counts, minimum, to_lowercase)
+
+	# development function
+	def load_counts(self, counts_path, minimum=DEFAULT_MIN_TOKEN_OCCURRENCES, to_lowercase=DEFAULT_TO_LOWERCASE): # builds the model from unpruned counts saved with save_model, keeping them to update the model later
+		counts = MM(model_path=counts_path)
+		self.reset_vars()
+		self.merge_counts(counts)
+		self.prune(minimum)
+		self.set_counts_model(counts, minimum, to_lowercase)
+
+	def set_counts_model(self, counts, minimum, to_lowercase):
+		self.counts = counts
+		self.counts_minimum = minimum
+		self.counts_to_lowercase = to_lowercase
+
+	# development function
+	def update(self, tagged_sentences): # folds newly tagged data into the model, patching only the counts it touches instead of retraining
+		if self.counts is None:
+			raise ValueError("the model has no unpruned counts to update, so train it with keep_counts=True or build it with load_counts")
+		new_counts = MM(model_path=None)
+		new_counts.set_counts(self.get_tagged_lines(tagged_sentences), to_lowercase=self.counts_to_lowercase)
+		with self.counts_lock: # the log likelihoods are never built from counts half updated, and threads tagging meanwhile keep the ones they started with
+			self.counts.merge_counts(new_counts)
+			# the tag and feature counts are never pruned, so they are added as they are
+			for key in new_counts.tag_to_tag_likelihood:
+				self.add_counts(self.tag_to_tag_likelihood.setdefault(key, {}), new_counts.tag_to_tag_likelihood[key])
+			self.add_counts(self.number_token_as_tag_likelihood, new_counts.number_token_as_tag_likelihood)
+			self.add_counts(self.hyphenated_token_as_tag_likelihood, new_counts.hyphenated_token_as_tag_likelihood)
+			self.add_counts(self.capitalized_token_as_tag_likelihood, new_counts.capitalized_token_as_tag_likelihood)
+			# a token seen less than the minimum is kept only in the unknown counts, so a token reaching the minimum moves its earlier counts out of them
+			for key in new_counts.token_as_tag_likelihood:
+				token_counts = self.counts.token_as_tag_likelihood[key]
+				if self.counts_minimum <= 1 or token_counts["total"] >= self.counts_minimum:
+					if key not in self.token_as_tag_likelihood:
+						for tag in token_counts:
+							earlier_count = token_counts[tag] - new_counts.token_as_tag_likelihood[key].get(tag, 0)
+							if earlier_count > 0:
+								self.unknown_token_as_tag_likelihood[tag] -= earlier_count
+								if self.unknown_token_as_tag_likelihood[tag] == 0:
+									self.unknown_token_as_tag_likelihood.pop(tag)
+					self.token_as_tag_likelihood[key] = dict(token_counts)
+				else:
+					self.add_counts(self.unknown_token_as_tag_likelihood, new_counts.token_as_tag_likelihood[key])
+			# the other pruned counts are dropped below the minimum
+			for table, counts_table, new_table in [(self.suffixed_token_as_tag_likelihood, self.counts.suffixed_token_as_tag_likelihood, new_counts.suffixed_token_as_tag_likelihood), (self.tag_to_tag_to_tag_likelihood, self.counts.tag_to_tag_to_tag_likelihood, new_counts.tag_to_tag_to_tag_likelihood), (self.bigram_tokens_as_tags_likelihood, self.counts.bigram_tokens_as_tags_likelihood, new_counts.bigram_tokens_as_tags_likelihood)]:
+				for key in new_table:
+					if self.counts_minimum <= 1 or counts_table[key]["total"] >= self.counts_minimum:
+						table[key] = dict(counts_table[key])
+			self.clear_caches()
+
+	def get_tagged_lines(self, tagged_sentences): # yields lines of training data from lines or from sentences of (token, tag) pairs
+		for tagged_sentence in tagged_sentences:
+			if isinstance(tagged_sentence, str):
+				yield tagged_sentence
+			else:
+				for token, tag in tagged_sentence:
+					yield "%s\t%s\n" % (token, tag)
+				yield "\n"
+
+	# development function
+	def set_counts(self, data, to_lowercase=DEFAULT_TO_LOWERCASE): # counts the data without pruning, so the counts can be merged with other counts
+		self.reset_vars()
+		for token, tag, prev_token, prev_tag, two_prev_tag in self.get_training_tokens(data, to_lowercase):
+			# update token-tag likelihood
+			self.add_count(self.token_as_tag_likelihood, token, tag)
+			self.add_token_feature_counts(token, tag)
+			self.add_tag_counts(tag, prev_tag, two_prev_tag)
+			# update bigram tags likelihood
+			if prev_tag is not None and len(prev_tag) > 0 and prev_token is not None and len(prev_token) > 0:
+				self.add_count(self.bigram_tokens_as_tags_likelihood, "%s %s" % (prev_token, token), "%s %s" % (prev_tag, tag))
+		self.clear_caches()
+
+	# development function
+	def merge_counts(self, model): # adds the counts of another model, which should be counted from data following this model's data
+		for table, other_table in [(self.token_as_tag_likelihood, model.token_as_tag_likelihood), (self.suffixed_token_as_tag_likelihood, model.suffixed_token_as_tag_likelihood), (self.tag_to_tag_likelihood, model.tag_to_tag_likelihood), (self.tag_to_tag_to_tag_likelihood, model.tag_to_tag_to_tag_likelihood), (self.bigram_tokens_as_tags_likelihood, model.bigram_tokens_as_tags_likelihood)]:
+			for key in other_table:
+				if key in table:
+					self.add_counts(table[key], other_table[key])
+				else:
+					table[key] = dict(other_table[key])
+		self.add_counts(self.number_token_as_tag_likelihood, model.number_token_as_tag_likelihood)
+		self.add_counts(self.hyphenated_token_as_tag_likelihood, model.hyphenated_token_as_tag_likelihood)
+		self.add_counts(self.capitalized_token_as_tag_likelihood, model.capitalized_token_as_tag_likelihood)
+		self.add_counts(self.unknown_token_as_tag_likelihood, model.unknown_token_as_tag_likelihood)
+		self.clear_caches()
+
+	def add_counts(self, tag_and_count_dict, other_tag_and_count_dict):
+		for tag in other_tag_and_count_dict:
+			if tag in tag_and_count_dict:
+				tag_and_count_dict[tag] += other_tag_and_count_dict[tag]
+			else:
+				tag_and_count_dict[tag] = other_tag_and_count_dict[tag]
 
 	# development function
-	def set_model(self, data, minimum=DEFAULT_MIN_TOKEN_OCCURRENCES, to_lowercase=DEFAULT_TO_LOWERCASE):
+	def set_model_streaming(self, data, minimum=DEFAULT_MIN_TOKEN_OCCURRENCES, to_lowercase=DEFAULT_TO_LOWERCASE, exact=True, max_counts_in_memory=DEFAULT_MAX_COUNTS_IN_MEMORY, spill_directory=None):
+		# trains in one pass. in exact mode a bounded number of token and bigram counts are held in memory, spilled to sorted
+		# runs on disk and merged, giving the same model as set_model. otherwise rare tokens and bigrams are only counted in a
+		# count-min sketch of bounded size until they reach the minimum, and every one reaching it is counted in memory. their
+		# occurrences before that count as unknown tokens, and only in the total of their own counts once they reach it
 		self.reset_vars()
+		with tempfile.TemporaryDirectory(dir=spill_directory) as directory:
+			if exact:
+				token_counts = SpilledCounts(os.path.join(directory, "tokens"), max_counts_in_memory//2)
+				bigram_counts = SpilledCounts(os.path.join(directory, "bigrams"), max_counts_in_memory//2)
+			else:
+				token_counts = SketchedCounts(minimum, max_counts_in_memory//2)
+				bigram_counts = SketchedCounts(minimum, max_counts_in_memory//2)
+			for position, (token, tag, prev_token, prev_tag, two_prev_tag) in enumerate(self.get_training_tokens(data, to_lowercase)):
+				token_counts.add(token, tag, position)
+				self.add_token_feature_counts(token, tag)
+				self.add_tag_counts(tag, prev_tag, two_prev_tag)
+				if prev_tag is not None and len(prev_tag) > 0 and prev_token is not None and len(prev_token) > 0:
+					bigram_counts.add("%s %s" % (prev_token, token), "%s %s" % (prev_tag, tag), position)
+			# merge the counts, storing tokens seen less than the minimum required as one "unknown" probability
+			unknown_counts = {} # the count and the (token first position, tag first position) ordering of each unknown tag
+			if not exact:
+				for tag, count, first_position in token_counts.get_rare_counts():
+					unknown_counts[tag] = [count, (first_position, first_position)]
+			kept_token_rows = []
+			for key, first_position, total, tags in token_counts.get_rows():
+				if minimum > 1 and total < minimum:
+					for tag, count, tag_first_position in [("total", total, -1)]+tags:
+						if tag in unknown_counts:
+							unknown_counts[tag][0] += count
+							unknown_counts[tag][1] = min(unknown_counts[tag][1], (first_position, tag_first_position))
+						else:
+							unknown_counts[tag] = [count, (first_position, tag_first_position)]
+				else:
+					kept_token_rows.append((first_position, key, total, tags))
+			self.token_as_tag_likelihood = self.build_ordered_table(kept_token_rows)
+			for tag in sorted(unknown_counts, key=lambda tag: unknown_counts[tag][1]):
+				self.unknown_token_as_tag_likelihood[tag] = unknown_counts[tag][0]
+			kept_bigram_rows = []
+			for key, first_position, total, tags in bigram_counts.get_rows():
+				if not (minimum > 1 and total < minimum):
+					kept_bigram_rows.append((first_position, key, total, tags))
+			self.bigram_tokens_as_tags_likelihood = self.build_ordered_table(kept_bigram_rows)
+		self.prune(minimum)
+
+	def build_ordered_table(self, rows): # builds a table from (first position, key, total, tags) rows, ordered as if the counts were added one at a time
+		table = {}
+		for _, key, total, tags in sorted(rows, key=lambda row: row[0]):
+			tag_and_count_dict = {"total": total}
+			for tag, count, _ in sorted(tags, key=lambda tag_count: tag_count[2]):
+				tag_and_count_dict[tag] = count
+			table[key] = tag_and_count_dict
+		return table
+
+	def get_training_tokens(self, data, to_lowercase): # yields each tagged token with the token and tags before it in its sentence
 		two_prev_tag = ""
 		prev_tag = ""
 		prev_token = ""
 		for line in data:
-			if "\t" in line and len(line) > 2:
+			if stream.is_token_line(line):
 				token_and_tag = line.split("\t")
 				token = token_and_tag[0].strip()
 				if to_lowercase:
 					token = token.lower()
 				tag = token_and_tag[1].strip()
-				# update token-tag likelihood
-				if token in self.token_as_tag_likelihood:
-					self.token_as_tag_likelihood[token]["total"] += 1
-					if tag in self.token_as_tag_likelihood[token]:
-						self.token_as_tag_likelihood[token][tag] += 1
-					else:
-						self.token_as_tag_likelihood[token][tag] = 1
-				else:
-					self.token_as_tag_likelihood[token] = {"total": 1, tag: 1}
-				# check if token contains a certain suffix
-				for suffix in self.SMOOTHING_SUFFIXES:
-					if token.endswith(suffix):
-						if suffix in self.suffixed_token_as_tag_likelihood:
-							self.suffixed_token_as_tag_likelihood[suffix]["total"] += 1
-							if tag in self.suffixed_token_as_tag_likelihood[suffix]:
-								self.suffixed_token_as_tag_likelihood[suffix][tag] += 1
-							else:
-								self.suffixed_token_as_tag_likelihood[suffix][tag] = 1
-						else:
-							self.suffixed_token_as_tag_likelihood[suffix] = {"total": 1, tag: 1}
-						break # break to avoid adding adding a token under multiple suffixes (i.e. "ity" and "ty")
-				# check if token contains a number
-				if self.is_number(token):
-					self.number_token_as_tag_likelihood["total"] += 1
-					if tag in self.number_token_as_tag_likelihood:
-						self.number_token_as_tag_likelihood[tag] += 1
-					else:
-						self.number_token_as_tag_likelihood[tag] = 1
-				# check if token contains a hyphen
-				if "-" in token:
-					self.hyphenated_token_as_tag_likelihood["total"] += 1
-					if tag in self.hyphenated_token_as_tag_likelihood:
-						self.hyphenated_token_as_tag_likelihood[tag] += 1
-					else:
-						self.hyphenated_token_as_tag_likelihood[tag] = 1
-				# check if token begins with capital letter
-				if token[0].isupper():
-					self.capitalized_token_as_tag_likelihood["total"] += 1
-					if tag in self.capitalized_token_as_tag_likelihood:
-						self.capitalized_token_as_tag_likelihood[tag] += 1
-					else:
-						self.capitalized_token_as_tag_likelihood[tag] = 1
-				# update tag-tag likelihood
-				if prev_tag is not None and len(prev_tag) > 0:
-					if prev_tag in self.tag_to_tag_likelihood:
-						self.tag_to_tag_likelihood[prev_tag]["total"] += 1
-						if tag in self.tag_to_tag_likelihood[prev_tag]:
-							self.tag_to_tag_likelihood[prev_tag][tag] += 1
-						else:
-							self.tag_to_tag_likelihood[prev_tag][tag] = 1
-					else:
-						self.tag_to_tag_likelihood[prev_tag] = {"total": 1, tag: 1}
-				# update tag-tag-tag likelihood
-				if prev_tag is not None and len(prev_tag) > 0 and two_prev_tag is not None and len(two_prev_tag) > 0:
-					prev_tags = "%s %s" % (two_prev_tag, prev_tag)
-					if prev_tags in self.tag_to_tag_to_tag_likelihood:
-						self.tag_to_tag_to_tag_likelihood[prev_tags]["total"] += 1
-						if tag in self.tag_to_tag_to_tag_likelihood[prev_tags]:
-							self.tag_to_tag_to_tag_likelihood[prev_tags][tag] += 1
-						else:
-							self.tag_to_tag_to_tag_likelihood[prev_tags][tag] = 1
-					else:
-						self.tag_to_tag_to_tag_likelihood[prev_tags] = {"total": 1, tag: 1}
-				# update bigram tags likelihood
-				if prev_tag is not None and len(prev_tag) > 0 and prev_token is not None and len(prev_token) > 0:
-					bigram_tokens = "%s %s" % (prev_token, token)
-					bigram_tags = "%s %s" % (prev_tag, tag)
-					if bigram_tokens in self.bigram_tokens_as_tags_likelihood:
-						self.bigram_tokens_as_tags_likelihood[bigram_tokens]["total"] += 1
-						if bigram_tags in self.bigram_tokens_as_tags_likelihood[bigram_tokens]:
-							self.bigram_tokens_as_tags_likelihood[bigram_tokens][bigram_tags] += 1
-						else:
-							self.bigram_tokens_as_tags_likelihood[bigram_tokens][bigram_tags] = 1
-					else:
-						self.bigram_tokens_as_tags_likelihood[bigram_tokens] = {"total": 1, bigram_tags: 1}
+				yield token, tag, prev_token, prev_tag, two_prev_tag
 				two_prev_tag = prev_tag
 				prev_tag = tag
 				prev_token = token
@@ -340,6 +921,48 @@ class MM:
 				two_prev_tag = ""
 				prev_tag = ""
 				prev_token = ""
+
+	def add_count(self, table, key, tag): # counts an occurrence of a tag for a key of a table
+		if key in table:
+			table[key]["total"] += 1
+			if tag in table[key]:
+				table[key][tag] += 1
+			else:
+				table[key][tag] = 1
+		else:
+			table[key] = {"total": 1, tag: 1}
+
+	def add_tag_count(self, tag_and_count_dict, tag):
+		tag_and_count_dict["total"] += 1
+		if tag in tag_and_count_dict:
+			tag_and_count_dict[tag] += 1
+		else:
+			tag_and_count_dict[tag] = 1
+
+	def add_token_feature_counts(self, token, tag):
+		# check if token contains a certain suffix, only adding the token under its longest one (i.e. "ity" and not "ty")
+		suffix = self.SMOOTHING_SUFFIX_TRIE.get_longest(token)
+		if suffix is not None:
+			self.add_count(self.suffixed_token_as_tag_likelihood, suffix, tag)
+		# check if token contains a number
+		if self.is_number(token):
+			self.add_tag_count(self.number_token_as_tag_likelihood, tag)
+		# check if token contains a hyphen
+		if "-" in token:
+			self.add_tag_count(self.hyphenated_token_as_tag_likelihood, tag)
+		# check if token begins with capital letter
+		if token[0].isupper():
+			self.add_tag_count(self.capitalized_token_as_tag_likelihood, tag)
+
+	def add_tag_counts(self, tag, prev_tag, two_prev_tag):
+		# update tag-tag likelihood
+		if prev_tag is not None and len(prev_tag) > 0:
+			self.add_count(self.tag_to_tag_likelihood, prev_tag, tag)
+		# update tag-tag-tag likelihood
+		if prev_tag is not None and len(prev_tag) > 0 and two_prev_tag is not None and len(two_prev_tag) > 0:
+			self.add_count(self.tag_to_tag_to_tag_likelihood, "%s %s" % (two_prev_tag, prev_tag), tag)
+
+	def prune(self, minimum):
 		# remove tokens seen less than the minimum required
 		if minimum > 1:
 			remove_token_keys = []
@@ -375,6 +998,7 @@ class MM:
 					remove_tag_to_tag_to_tag_keys.append(key)
 			for key in remove_tag_to_tag_to_tag_keys:
 				self.tag_to_tag_to_tag_likelihood.pop(key)
+		self.clear_caches()
 
 	def is_number(self, string):
 		for char in string:
@@ -385,7 +1009,10 @@ class MM:
 		return True
 
 	# development function
-	def save_model(self, save_path):
+	def save_model(self, save_path, binary=False):
+		if binary:
+			self.save_binary_model(save_path)
+			return
 		token_as_tag_likelihood_string = ""
 		for key in self.token_as_tag_likelihood:
 			token_as_tag_likelihood_string += "TOKEN:\t%s\n" % key
@@ -432,4 +1059,606 @@ class MM:
 		model_string = "%s\n\n\n%s\n\n\n%s\n\n\n%s\n\n\n%s\n\n\n%s\n\n\n%s\n\n\n%s\n\n\n%s" % (token_as_tag_likelihood_string.strip(), suffixed_token_as_tag_likelihood_string.strip(), number_token_as_tag_likelihood_string.strip(), hyphenated_token_as_tag_likelihood_string.strip(), capitalized_token_as_tag_likelihood_string.strip(), unknown_token_as_tag_likelihood_string.strip(), tag_to_tag_likelihood_string.strip(), tag_to_tag_to_tag_likelihood_string.strip(), bigram_tokens_as_tags_likelihood_string.strip())
 		# save the model
 		with open(save_path, "w") as model_file:
-			model_file.write(model_string)
\ No newline at end of file
+			model_file.write(model_string)
+
+	# development function
+	def save_binary_model(self, save_path):
+		# the counts are saved section by section as in the text format, as rows of (column, count) pairs
+		count_tables = [self.token_as_tag_likelihood, self.suffixed_token_as_tag_likelihood, {"NUMBER": self.number_token_as_tag_likelihood}, {"HYPHEN": self.hyphenated_token_as_tag_likelihood}, {"CAPITALIZED": self.capitalized_token_as_tag_likelihood}, {"UNKNOWN": self.unknown_token_as_tag_likelihood}, self.tag_to_tag_likelihood, self.tag_to_tag_to_tag_likelihood, self.bigram_tokens_as_tags_likelihood]
+		row_sections = []
+		row_keys = []
+		offsets = [0]
+		column_ids = {}
+		row_column_ids = []
+		counts = []
+		for section, table in enumerate(count_tables):
+			for key in table:
+				row_sections.append(section)
+				row_keys.append(key)
+				for column in table[key]:
+					if column not in column_ids:
+						column_ids[column] = len(column_ids)
+					row_column_ids.append(column_ids[column])
+					counts.append(int(table[key][column]))
+				offsets.append(len(counts))
+		count_arrays = {"count_row_sections": np.array(row_sections, dtype=np.uint8), "count_row_keys": binary_model.encode_strings(row_keys), "count_offsets": np.array(offsets, dtype=binary_model.get_index_dtype(len(counts))), "count_columns": binary_model.encode_strings(list(column_ids)), "count_column_ids": np.array(row_column_ids, dtype=binary_model.get_index_dtype(len(column_ids))), "count_values": np.array(counts, dtype=binary_model.get_index_dtype(max(counts, default=0)))}
+		table_sizes = self.get_table_sizes()
+		values, arrays = self.compile().get_binary_arrays()
+		values["count_row_count"] = len(row_keys)
+		values["count_column_count"] = len(column_ids)
+		values["count_table_sizes"] = {name: table_sizes[name] for name in ["token", "suffix", "unknown", "tag", "trag", "bigram"]}
+		# the counts are only read to train, update or save the model, so they are compressed instead of used in place
+		values["count_arrays"], arrays["count_data"] = binary_model.pack_arrays(count_arrays)
+		binary_model.write_binary_model(save_path, "MM", values, arrays)
+
+class SpilledCounts: # counts of (key, tag) pairs, spilled to sorted runs on disk whenever too many are held in memory
+
+	def __init__(self, spill_path, max_counts):
+		self.spill_path = spill_path # the path prefix of the run files
+		self.max_counts = max(max_counts, 1)
+		self.counts = {} # the first position and the count and first position of each tag of each key
+		self.count_size = 0 # the number of (key, tag) pairs held in memory
+		self.run_paths = []
+
+	def add(self, key, tag, position):
+		if key in self.counts:
+			tag_counts = self.counts[key][1]
+			if tag in tag_counts:
+				tag_counts[tag][0] += 1
+			else:
+				tag_counts[tag] = [1, position]
+				self.count_size += 1
+		else:
+			self.counts[key] = [position, {tag: [1, position]}]
+			self.count_size += 1
+		if self.count_size >= self.max_counts:
+			self.spill()
+
+	def spill(self):
+		run_path = "%s-%d.txt" % (self.spill_path, len(self.run_paths))
+		with open(run_path, "w") as run:
+			for key, tag, count, first_position, tag_first_position in self.get_sorted_counts():
+				run.write("%s\t%s\t%d\t%d\t%d\n" % (key, tag, count, first_position, tag_first_position))
+		self.run_paths.append(run_path)
+		self.counts = {}
+		self.count_size = 0
+
+	def get_sorted_counts(self):
+		for key in sorted(self.counts):
+			first_position, tag_counts = self.counts[key]
+			for tag in sorted(tag_counts):
+				yield key, tag, tag_counts[tag][0], first_position, tag_counts[tag][1]
+
+	def read_run(self, run_path):
+		with open(run_path) as run:
+			for line in run:
+				key, tag, count, first_position, tag_first_position = line.rstrip("\n").split("\t")
+				yield key, tag, int(count), int(first_position), int(tag_first_position)
+
+	def get_rows(self): # yields the (key, first position, total, [(tag, count, first position)]) of every key in sorted order, merged over all runs
+		current_key = None
+		current_first_position = 0
+		current_tags = []
+		for key, tag, count, first_position, tag_first_position in heapq.merge(self.get_sorted_counts(), *[self.read_run(run_path) for run_path in self.run_paths]):
+			if key != current_key:
+				if current_key is not None:
+					yield current_key, current_first_position, sum(count for _, count, _ in current_tags), current_tags
+				current_key = key
+				current_first_position = first_position
+				current_tags = []
+			current_first_position = min(current_first_position, first_position)
+			if len(current_tags) > 0 and current_tags[-1][0] == tag:
+				current_tags[-1] = (tag, current_tags[-1][1]+count, min(current_tags[-1][2], tag_first_position))
+			else:
+				current_tags.append((tag, count, tag_first_position))
+		if current_key is not None:
+			yield current_key, current_first_position, sum(count for _, count, _ in current_tags), current_tags
+
+class SketchedCounts: # counts of (key, tag) pairs, exact only for keys whose count-min sketch estimate reaches the minimum
+
+	DEFAULT_DEPTH = 4 # the default number of hash rows in the sketch, at most 16
+
+	def __init__(self, minimum, max_counts, depth=DEFAULT_DEPTH):
+		self.minimum = minimum
+		self.width = max(max_counts//depth, 1)
+		self.sketch = np.zeros((depth, self.width), dtype=np.int64)
+		self.counts = {} # the first position, the count and first position of each tag, and the occurrences before its promotion of each promoted key
+		self.rare_counts = {} # the count and first position of each tag, and of their total, of occurrences before their key was promoted
+
+	def add(self, key, tag, position):
+		if key not in self.counts:
+			# a 32 bit hash of the key for each row, the same in every process unlike hash(), so the same data always gives the same model
+			hashes = np.frombuffer(hashlib.blake2b(key.encode("utf-8"), digest_size=4*len(self.sketch)).digest(), dtype="<u4")
+			cells = [int(key_hash) % self.width for key_hash in hashes]
+			estimate = min(int(self.sketch[row, cell]) for row, cell in enumerate(cells))+1
+			for row, cell in enumerate(cells):
+				if self.sketch[row, cell] < estimate: # conservative update
+					self.sketch[row, cell] = estimate
+			if estimate < self.minimum:
+				for rare_tag in ["total", tag]:
+					if rare_tag in self.rare_counts:
+						self.rare_counts[rare_tag][0] += 1
+					else:
+						self.rare_counts[rare_tag] = [1, position]
+				return
+			# the key is a heavy hitter from now on. it was seen at most minimum-1 times before, or it would have been promoted
+			# then, and at most estimate-1 times, which is exact unless other keys sharing its cells made the sketch overestimate
+			self.counts[key] = [position, {}, min(estimate, self.minimum)-1]
+		tag_counts = self.counts[key][1]
+		if tag in tag_counts:
+			tag_counts[tag][0] += 1
+		else:
+			tag_counts[tag] = [1, position]
+
+	def get_rare_counts(self):
+		return [(tag, self.rare_counts[tag][0], self.rare_counts[tag][1]) for tag in self.rare_counts]
+
+	def get_rows(self):
+		for key in sorted(self.counts):
+			first_position, tag_counts, earlier_count = self.counts[key]
+			yield key, first_position, earlier_count+sum(tag_counts[tag][0] for tag in tag_counts), [(tag, tag_counts[tag][0], tag_counts[tag][1]) for tag in tag_counts]
+
+class CompiledMM:
+
+	DEFAULT_TO_LOWERCASE = MM.DEFAULT_TO_LOWERCASE
+	BINARY_ARRAYS = ["token_is_known", "lexical_offsets", "lexical_tags", "lexical_log_probabilities", "number_log_probabilities", "hyphenated_log_probabilities", "capitalized_log_probabilities", "tag_to_tag_log_probabilities", "tag_to_tag_to_tag_rows", "tag_to_tag_to_tag_log_probabilities", "bigram_keys", "bigram_tag_pair_keys", "bigram_tag_pair_log_probabilities", "bigram_first_tag_keys", "bigram_first_tag_log_probabilities"] # the arrays saved in a binary model
+
+	def __init__(self, model=None, model_path=None):
+		self.reset_vars()
+		if model is not None:
+			self.compile_model(model)
+		elif model_path is not None: # load only the compiled arrays of a binary model, without the counts behind them
+			values, arrays = binary_model.read_binary_model(model_path, "MM")
+			self.load_binary_arrays(values, arrays)
+
+	def reset_vars(self):
+		self.tags = [] # the tag of each tag id
+		self.tag_ids = {} # the tag id of each tag
+		self.token_ids = {} # the token id of each token seen in the token or bigram tables
+		self.token_is_known = np.zeros(0, dtype=bool) # whether or not each token id has its own tag counts
+		self.suffixes = [] # the suffixes, each with a lexical row after the token rows
+		self.suffix_trie = SuffixTrie() # the lexical row of each suffix, indexed to find the longest suffix of an unknown token
+		self.unknown_row = 0 # the lexical row used for unknown tokens without a known suffix
+		self.lexical_offsets = np.zeros(1, dtype=np.int64) # the start of each lexical row in the lexical arrays
+		self.lexical_tags = np.zeros(0, dtype=np.int32) # the tag id of each lexical entry, in the order of the original counts
+		self.lexical_log_probabilities = np.zeros(0) # the log probability of each lexical entry
+		self.number_log_probabilities = np.zeros(0) # the log probability of each tag for an unknown token containing a number
+		self.hyphenated_log_probabilities = np.zeros(0) # the log probability of each tag for an unknown token with a hyphen
+		self.capitalized_log_probabilities = np.zeros(0) # the log probability of each tag for an unknown token starting with a capital character
+		self.tag_to_tag_log_probabilities = np.zeros((0, 0)) # the log probability of a tag following a given tag
+		self.tag_to_tag_to_tag_rows = np.zeros((0, 0), dtype=np.int32) # the row of each pair of tags in the trigram table, 0 for a pair not kept in it
+		self.tag_to_tag_to_tag_log_probabilities = np.zeros((1, 0)) # the log probability of a tag following the pair of tags of each row, after an unused first row
+		self.bigram_keys = np.zeros(0, dtype=np.int64) # the sorted keys (first token id * token count + second token id) of all bigrams
+		self.bigram_tag_pair_keys = np.zeros(0, dtype=np.int64) # the sorted keys (bigram index * tag count^2 + first tag id * tag count + second tag id) of all bigram tag pairs
+		self.bigram_tag_pair_log_probabilities = np.zeros(0) # the log probability of each bigram tag pair
+		self.bigram_first_tag_keys = np.zeros(0, dtype=np.int64) # the sorted keys (bigram index * tag count + first tag id) of all bigram first tags
+		self.bigram_first_tag_log_probabilities = np.zeros(0) # the log probability of the first tag of each bigram, summed over the second tags
+
+	def compile_model(self, model):
+		self.reset_vars()
+		# intern all tags and tokens as ids
+		for tag_and_count_dict in [model.number_token_as_tag_likelihood, model.hyphenated_token_as_tag_likelihood, model.capitalized_token_as_tag_likelihood, model.unknown_token_as_tag_likelihood]:
+			self.add_tags(tag_and_count_dict)
+		for table in [model.token_as_tag_likelihood, model.suffixed_token_as_tag_likelihood, model.tag_to_tag_likelihood, model.tag_to_tag_to_tag_likelihood]:
+			for key in table:
+				self.add_tags(table[key])
+		self.add_tags(model.tag_to_tag_likelihood)
+		for key in model.tag_to_tag_to_tag_likelihood:
+			self.add_tags(key.split(" "))
+		for token in model.token_as_tag_likelihood:
+			self.add_token(token)
+		bigrams = [] # the (first token id, second token id, tag pair counts) of each bigram
+		for key in model.bigram_tokens_as_tags_likelihood:
+			bigram_tokens = key.split(" ")
+			if len(bigram_tokens) == 2:
+				for bigram_tags in model.bigram_tokens_as_tags_likelihood[key]:
+					self.add_tags(bigram_tags.split(" "))
+				bigrams.append((self.add_token(bigram_tokens[0]), self.add_token(bigram_tokens[1]), model.bigram_tokens_as_tags_likelihood[key]))
+		tag_count = len(self.tags)
+		token_count = len(self.token_ids)
+		# build the lexical rows: one per token id, then one per suffix, then the unknown row
+		self.token_is_known = np.zeros(token_count, dtype=bool)
+		lexical_rows = [{}] * token_count
+		for token in model.token_as_tag_likelihood:
+			self.token_is_known[self.token_ids[token]] = True
+			lexical_rows[self.token_ids[token]] = model.token_as_tag_likelihood[token]
+		for suffix in model.suffixed_token_as_tag_likelihood:
+			if suffix != "total":
+				self.suffixes.append(suffix)
+				lexical_rows.append(model.suffixed_token_as_tag_likelihood[suffix])
+		self.index_suffixes()
+		self.unknown_row = len(lexical_rows)
+		lexical_rows.append(model.unknown_token_as_tag_likelihood)
+		lexical_offsets = [0]
+		lexical_tags = []
+		lexical_log_probabilities = []
+		for tag_and_count_dict in lexical_rows:
+			total = int(tag_and_count_dict.get("total", 0))
+			for tag in tag_and_count_dict:
+				if tag != "total":
+					lexical_tags.append(self.tag_ids[tag])
+					lexical_log_probabilities.append(self.log_probability(int(tag_and_count_dict[tag]), total))
+			lexical_offsets.append(len(lexical_tags))
+		self.lexical_offsets = np.array(lexical_offsets, dtype=np.int64)
+		self.lexical_tags = np.array(lexical_tags, dtype=np.int32)
+		self.lexical_log_probabilities = np.array(lexical_log_probabilities, dtype=np.float64)
+		self.number_log_probabilities = self.build_vector(model.number_token_as_tag_likelihood)
+		self.hyphenated_log_probabilities = self.build_vector(model.hyphenated_token_as_tag_likelihood)
+		self.capitalized_log_probabilities = self.build_vector(model.capitalized_token_as_tag_likelihood)
+		# build the dense tag transition tables
+		self.tag_to_tag_log_probabilities = np.full((tag_count, tag_count), -np.inf)
+		for prev_tag in model.tag_to_tag_likelihood:
+			self.tag_to_tag_log_probabilities[self.tag_ids[prev_tag]] = self.build_vector(model.tag_to_tag_likelihood[prev_tag])
+		# only the pairs of tags kept in the trigram table get a row, since most pairs are never seen
+		self.tag_to_tag_to_tag_rows = np.zeros((tag_count, tag_count), dtype=np.int32)
+		self.tag_to_tag_to_tag_log_probabilities = np.full((len(model.tag_to_tag_to_tag_likelihood)+1, tag_count), -np.inf)
+		for row, prev_tags in enumerate(model.tag_to_tag_to_tag_likelihood, 1):
+			two_prev_tag, prev_tag = prev_tags.split(" ")
+			self.tag_to_tag_to_tag_rows[self.tag_ids[two_prev_tag], self.tag_ids[prev_tag]] = row
+			self.tag_to_tag_to_tag_log_probabilities[row] = self.build_vector(model.tag_to_tag_to_tag_likelihood[prev_tags])
+		# build the bigram tag pairs and the first tag marginals, keyed by the index of their sorted bigram
+		bigrams.sort(key=lambda bigram: bigram[0]*token_count+bigram[1])
+		self.bigram_keys = np.array([bigram[0]*token_count+bigram[1] for bigram in bigrams], dtype=np.int64)
+		bigram_tag_pairs = {}
+		bigram_first_tags = {}
+		for i, (_, _, bigram_tags_and_counts) in enumerate(bigrams):
+			total = int(bigram_tags_and_counts["total"])
+			first_tag_counts = {}
+			for bigram_tags in bigram_tags_and_counts:
+				if " " in bigram_tags:
+					prev_tag, tag = bigram_tags.split(" ")
+					count = int(bigram_tags_and_counts[bigram_tags])
+					bigram_tag_pairs[(i*tag_count+self.tag_ids[prev_tag])*tag_count+self.tag_ids[tag]] = self.log_probability(count, total)
+					first_tag_counts[self.tag_ids[prev_tag]] = first_tag_counts.get(self.tag_ids[prev_tag], 0)+count
+			for prev_tag in first_tag_counts:
+				bigram_first_tags[i*tag_count+prev_tag] = self.log_probability(first_tag_counts[prev_tag], total)
+		self.bigram_tag_pair_keys, self.bigram_tag_pair_log_probabilities = self.build_sorted_table(bigram_tag_pairs)
+		self.bigram_first_tag_keys, self.bigram_first_tag_log_probabilities = self.build_sorted_table(bigram_first_tags)
+
+	def get_binary_arrays(self):
+		values = {"tag_count": len(self.tags), "token_count": len(self.token_ids), "suffix_count": len(self.suffixes), "unknown_row": self.unknown_row}
+		arrays = {"compiled_tags": binary_model.encode_strings(self.tags), "compiled_tokens": binary_model.encode_strings(list(self.token_ids)), "compiled_suffixes": binary_model.encode_strings(self.suffixes)}
+		for name in self.BINARY_ARRAYS:
+			arrays["compiled_%s" % name] = getattr(self, name)
+		return values, arrays
+
+	def load_binary_arrays(self, values, arrays):
+		self.reset_vars()
+		self.tags = binary_model.decode_strings(arrays["compiled_tags"], values["tag_count"])
+		self.tag_ids = dict(zip(self.tags, range(len(self.tags))))
+		self.token_ids = dict(zip(binary_model.decode_strings(arrays["compiled_tokens"], values["token_count"]), range(values["token_count"])))
+		self.suffixes = binary_model.decode_strings(arrays["compiled_suffixes"], values["suffix_count"])
+		self.index_suffixes()
+		self.unknown_row = values["unknown_row"]
+		for name in self.BINARY_ARRAYS:
+			setattr(self, name, arrays["compiled_%s" % name])
+
+	def add_tags(self, tags):
+		for tag in tags:
+			if tag != "total" and tag not in self.tag_ids:
+				self.tag_ids[tag] = len(self.tags)
+				self.tags.append(tag)
+
+	def add_token(self, token):
+		if token not in self.token_ids:
+			self.token_ids[token] = len(self.token_ids)
+		return self.token_ids[token]
+
+	def log_probability(self, count, total):
+		if count <= 0 or total <= 0:
+			return -math.inf
+		return math.log(count/total)
+
+	def build_vector(self, tag_and_count_dict): # the log probability of every tag id, negative infinity for unseen tags
+		vector = np.full(len(self.tags), -np.inf)
+		total = int(tag_and_count_dict.get("total", 0))
+		for tag in tag_and_count_dict:
+			if tag != "total":
+				vector[self.tag_ids[tag]] = self.log_probability(int(tag_and_count_dict[tag]), total)
+		return vector
+
+	def build_sorted_table(self, key_and_value_dict):
+		keys = np.array(sorted(key_and_value_dict), dtype=np.int64)
+		values = np.array([key_and_value_dict[key] for key in keys.tolist()], dtype=np.float64)
+		return keys, values
+
+	def lookup(self, sorted_keys, values, keys, default): # vectorized lookup of keys in a sorted table
+		if len(sorted_keys) == 0:
+			return np.full(keys.shape, default, dtype=values.dtype)
+		indices = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys)-1)
+		return np.where(sorted_keys[indices] == keys, values[indices], default)
+
+	is_number = MM.is_number
+
+	def get_lexical_row(self, token): # returns the lexical row used for a token and whether or not the token is unknown
+		token_id = self.token_ids.get(token, -1)
+		if token_id >= 0 and self.token_is_known[token_id]:
+			return token_id, False
+		return self.suffix_trie.get_longest(token, self.unknown_row), True
+
+	def index_suffixes(self):
+		self.suffix_trie = SuffixTrie()
+		for i, suffix in enumerate(self.suffixes):
+			self.suffix_trie.add(suffix, len(self.token_ids)+i)
+
+	def score_sentences(self, sentences, to_lowercase=MM.DEFAULT_TO_LOWERCASE):
+		# scores every candidate tag of every position for every pair of candidate tags of the two previous positions.
+		# the entries of a position form a (two previous candidates, previous candidates, candidates) grid, flattened and
+		# concatenated over all positions of all sentences. the tags before the start of a sentence are a single "no tag" candidate
+		rows = []
+		is_unknown = []
+		token_ids = []
+		current_token_ids = []
+		prev_token_ids = [] # the id of the previous token, -1 if there is none
+		next_token_ids = [] # the id of the next token, -1 if there is none
+		sentence_indices = [] # the index of each position in its sentence
+		is_number = []
+		is_hyphenated = []
+		is_capitalized = []
+		for sentence in sentences:
+			for i, token in enumerate(sentence):
+				current_token = token
+				if to_lowercase:
+					current_token = token.lower()
+				row, is_unknown_token = self.get_lexical_row(current_token)
+				rows.append(row)
+				is_unknown.append(is_unknown_token)
+				token_ids.append(self.token_ids.get(token, -1))
+				current_token_ids.append(self.token_ids.get(current_token, -1))
+				prev_token_ids.append(token_ids[-2] if i > 0 and len(sentence[i-1]) > 0 else -1)
+				next_token_ids.append(self.token_ids.get(sentence[i+1], -1) if i+1 < len(sentence) and len(sentence[i+1]) > 0 else -1)
+				sentence_indices.append(i)
+				is_number.append(is_unknown_token and self.is_number(current_token))
+				is_hyphenated.append(is_unknown_token and "-" in current_token)
+				is_capitalized.append(is_unknown_token and current_token[:1].isupper())
+		position_count = len(rows)
+		rows = np.array(rows, dtype=np.int64)
+		sentence_indices = np.array(sentence_indices, dtype=np.int64)
+		is_sentence_end = np.append(sentence_indices[1:] == 0, True) if position_count > 0 else sentence_indices == 0
+		# gather the candidate tags of every position, using a single "no tag" candidate for positions without any
+		lexical_starts = self.lexical_offsets[rows]
+		lexical_counts = self.lexical_offsets[rows+1]-lexical_starts
+		candidate_counts = np.maximum(lexical_counts, 1)
+		candidate_offsets = np.concatenate(([0], np.cumsum(candidate_counts)))
+		candidate_positions = np.repeat(np.arange(position_count), candidate_counts)
+		candidate_indices = np.arange(candidate_offsets[-1])-candidate_offsets[candidate_positions]
+		has_candidate = candidate_indices < lexical_counts[candidate_positions]
+		lexical_indices = np.where(has_candidate, lexical_starts[candidate_positions]+candidate_indices, 0)
+		candidate_tags = np.append(np.where(has_candidate, self.lexical_tags[lexical_indices] if len(self.lexical_tags) > 0 else -1, -1), -1) # the last candidate is the "no tag" before the start of a sentence
+		candidate_log_probabilities = np.where(has_candidate, self.lexical_log_probabilities[lexical_indices] if len(self.lexical_tags) > 0 else -np.inf, -np.inf)
+		no_tag_offset = candidate_offsets[-1]
+		prev_positions = np.maximum(np.arange(position_count)-1, 0)
+		prev_offsets = np.where(sentence_indices > 0, candidate_offsets[prev_positions], no_tag_offset)
+		prev_counts = np.where(sentence_indices > 0, candidate_counts[prev_positions], 1)
+		two_prev_positions = np.maximum(np.arange(position_count)-2, 0)
+		two_prev_offsets = np.where(sentence_indices > 1, candidate_offsets[two_prev_positions], no_tag_offset)
+		two_prev_counts = np.where(sentence_indices > 1, candidate_counts[two_prev_positions], 1)
+		# lay out the entries of every position
+		group_counts = two_prev_counts*prev_counts
+		group_offsets = np.concatenate(([0], np.cumsum(group_counts)))
+		entry_offsets = np.concatenate(([0], np.cumsum(group_counts*candidate_counts)))
+		entry_positions = np.repeat(np.arange(position_count), group_counts*candidate_counts)
+		entry_indices = np.arange(entry_offsets[-1])-entry_offsets[entry_positions]
+		entry_candidate_counts = candidate_counts[entry_positions]
+		tag_indices = entry_indices % entry_candidate_counts
+		group_indices = entry_indices // entry_candidate_counts
+		prev_tag_indices = group_indices % prev_counts[entry_positions]
+		two_prev_tag_indices = group_indices // prev_counts[entry_positions]
+		entry_candidates = candidate_offsets[entry_positions]+tag_indices
+		tags = candidate_tags[entry_candidates]
+		prev_tags = candidate_tags[prev_offsets[entry_positions]+prev_tag_indices]
+		two_prev_tags = candidate_tags[two_prev_offsets[entry_positions]+two_prev_tag_indices]
+		# score every entry
+		has_prev = prev_tags >= 0
+		safe_tags = np.maximum(tags, 0)
+		safe_prev_tags = np.maximum(prev_tags, 0)
+		safe_two_prev_tags = np.maximum(two_prev_tags, 0)
+		lexical = candidate_log_probabilities[entry_candidates]
+		tag_to_tag = self.tag_to_tag_log_probabilities[safe_prev_tags, safe_tags]
+		trigram_rows = self.tag_to_tag_to_tag_rows[safe_two_prev_tags, safe_prev_tags]
+		has_trigram = has_prev & (two_prev_tags >= 0) & (trigram_rows > 0)
+		transition = np.where(has_trigram, self.tag_to_tag_to_tag_log_probabilities[trigram_rows, safe_tags], tag_to_tag)
+		log_likelihoods = lexical+np.where(has_prev, transition, 0.0)
+		for is_feature, feature_log_probabilities in [(is_number, self.number_log_probabilities), (is_hyphenated, self.hyphenated_log_probabilities), (is_capitalized, self.capitalized_log_probabilities)]:
+			has_feature = has_prev & np.array(is_feature, dtype=bool)[entry_positions]
+			log_likelihoods = log_likelihoods+np.where(has_feature, feature_log_probabilities[safe_tags], 0.0)
+		current_token_ids = np.array(current_token_ids, dtype=np.int64)
+		tag_count = len(self.tags)
+		prev_bigrams = self.find_bigrams(np.array(prev_token_ids, dtype=np.int64), current_token_ids)
+		entry_prev_bigrams = prev_bigrams[entry_positions]
+		has_prev_bigram = has_prev & (entry_prev_bigrams >= 0)
+		prev_bigram = self.lookup(self.bigram_tag_pair_keys, self.bigram_tag_pair_log_probabilities, (entry_prev_bigrams*tag_count+safe_prev_tags)*tag_count+safe_tags, -np.inf)
+		log_likelihoods = log_likelihoods+np.where(has_prev_bigram, prev_bigram, 0.0)
+		next_bigrams = self.find_bigrams(current_token_ids, np.array(next_token_ids, dtype=np.int64))
+		entry_next_bigrams = next_bigrams[entry_positions]
+		next_bigram = self.lookup(self.bigram_first_tag_keys, self.bigram_first_tag_log_probabilities, entry_next_bigrams*tag_count+safe_tags, -np.inf)
+		log_likelihoods = log_likelihoods+np.where(entry_next_bigrams >= 0, next_bigram, 0.0)
+		# if all the tag likelihoods of a context were reset to 0, figure out a tie-breaker
+		group_starts = entry_offsets[:-1][np.repeat(np.arange(position_count), group_counts)]+(np.arange(group_offsets[-1])-np.repeat(group_offsets[:-1], group_counts))*np.repeat(candidate_counts, group_counts)
+		is_fallback = np.zeros(len(group_starts), dtype=bool)
+		if len(log_likelihoods) > 0:
+			is_fallback = np.isneginf(np.maximum.reduceat(log_likelihoods, group_starts))
+		entry_groups = group_offsets[entry_positions]+group_indices
+		fallback = lexical+np.where(has_prev, tag_to_tag, 0.0)
+		log_likelihoods = np.where(is_fallback[entry_groups] & (tags >= 0), fallback, log_likelihoods)
+		log_likelihoods = np.where(tags >= 0, log_likelihoods, 0.0) # the "no tag" candidate of a position without any neither adds to nor takes from the score
+		return {"entry_offsets": entry_offsets, "group_offsets": group_offsets, "group_starts": group_starts, "entry_groups": entry_groups, "candidate_offsets": candidate_offsets, "candidate_counts": candidate_counts, "candidate_tags": candidate_tags, "prev_counts": prev_counts, "two_prev_counts": two_prev_counts, "is_sentence_end": is_sentence_end, "prev_tag_indices": prev_tag_indices, "tag_indices": tag_indices, "entry_positions": entry_positions, "log_likelihoods": log_likelihoods, "is_fallback": is_fallback}
+
+	def find_bigrams(self, first_token_ids, second_token_ids): # returns the bigram index of each pair of token ids, or -1 if the bigram is not known
+		keys = first_token_ids*len(self.token_ids)+second_token_ids
+		bigrams = self.lookup(self.bigram_keys, np.arange(len(self.bigram_keys)), keys, -1)
+		return np.where((first_token_ids >= 0) & (second_token_ids >= 0), bigrams, -1)
+
+	def add_lookahead(self, scored, log_likelihoods): # adds to each entry the best score of the entries following it at the next position
+		group_maximums = np.maximum.reduceat(log_likelihoods, scored["group_starts"]) if len(log_likelihoods) > 0 else log_likelihoods
+		entry_positions = scored["entry_positions"]
+		has_next = ~scored["is_sentence_end"][entry_positions]
+		next_groups = np.where(has_next, scored["group_offsets"][np.minimum(entry_positions+1, len(scored["group_offsets"])-2)]+scored["prev_tag_indices"]*scored["candidate_counts"][entry_positions]+scored["tag_indices"], 0)
+		return np.where(has_next, scored["log_likelihoods"]+group_maximums[next_groups] if len(group_maximums) > 0 else 0.0, scored["log_likelihoods"])
+
+	def get_pos_tags(self, sentence, to_lowercase=MM.DEFAULT_TO_LOWERCASE, decoder=MM.DEFAULT_DECODER):
+		if decoder == "viterbi":
+			return self.get_pos_tags_viterbi(sentence, to_lowercase=to_lowercase)[0]
+		elif decoder != "lookahead":
+			raise ValueError("unknown decoder: %s" % decoder)
+		scored = self.score_sentences([sentence], to_lowercase=to_lowercase)
+		# score each entry with its best continuation over the next two positions
+		scores = self.add_lookahead(scored, self.add_lookahead(scored, scored["log_likelihoods"])).tolist()
+		log_likelihoods = scored["log_likelihoods"].tolist()
+		is_fallback = scored["is_fallback"].tolist()
+		entry_offsets = scored["entry_offsets"].tolist()
+		candidate_counts = scored["candidate_counts"].tolist()
+		prev_counts = scored["prev_counts"].tolist()
+		candidate_offsets = scored["candidate_offsets"].tolist()
+		candidate_tags = scored["candidate_tags"].tolist()
+		group_offsets = scored["group_offsets"].tolist()
+		tag_predictions = []
+		prev_tag_index = 0
+		two_prev_tag_index = 0
+		for i in range(len(sentence)):
+			start = entry_offsets[i]+(two_prev_tag_index*prev_counts[i]+prev_tag_index)*candidate_counts[i]
+			group = group_offsets[i]+two_prev_tag_index*prev_counts[i]+prev_tag_index
+			tag_index = 0
+			best_score = None
+			for j in range(candidate_counts[i]):
+				if is_fallback[group] or log_likelihoods[start+j] > -math.inf: # zero likelihood tags are skipped unless every tag was zero
+					if best_score is None or scores[start+j] >= best_score: # ties go to the last candidate
+						best_score = scores[start+j]
+						tag_index = j
+			tag = candidate_tags[candidate_offsets[i]+tag_index]
+			tag_predictions.append(self.tags[tag] if tag >= 0 else "")
+			two_prev_tag_index = prev_tag_index
+			prev_tag_index = tag_index
+		return tag_predictions
+
+	def get_pos_tags_viterbi(self, sentence, to_lowercase=MM.DEFAULT_TO_LOWERCASE):
+		if len(sentence) == 0:
+			return [], 0.0
+		scored = self.score_sentences([sentence], to_lowercase=to_lowercase)
+		scores = np.zeros((1, 1)) # the best log score of each (two previous tag, previous tag) state
+		back_pointers = [] # for each position, the best two previous tag index of each (previous tag, tag) state
+		for i in range(len(sentence)):
+			shape = (scored["two_prev_counts"][i], scored["prev_counts"][i], scored["candidate_counts"][i])
+			next_scores = scores[:, :, None]+scored["log_likelihoods"][scored["entry_offsets"][i]:scored["entry_offsets"][i+1]].reshape(shape)
+			back_pointers.append(np.argmax(next_scores, axis=0))
+			scores = np.max(next_scores, axis=0)
+		# trace back from the best final state
+		prev_tag_index, tag_index = np.unravel_index(np.argmax(scores), scores.shape)
+		best_score = float(scores[prev_tag_index, tag_index])
+		tag_indices = [int(tag_index)]
+		i = len(sentence)-1
+		while i > 0:
+			tag_indices.append(int(prev_tag_index))
+			prev_tag_index, tag_index = back_pointers[i][prev_tag_index, tag_index], prev_tag_index
+			i -= 1
+		tag_indices.reverse()
+		tag_predictions = []
+		for i, tag_index in enumerate(tag_indices):
+			tag = int(scored["candidate_tags"][scored["candidate_offsets"][i]+tag_index])
+			tag_predictions.append(self.tags[tag] if tag >= 0 else "")
+		return tag_predictions, best_score
+
+	def get_pos_tags_batch(self, sentences, to_lowercase=MM.DEFAULT_TO_LOWERCASE, decoder=MM.DEFAULT_DECODER, batch_size=MM.DEFAULT_BATCH_SIZE):
+		if decoder != "lookahead" and decoder != "viterbi":
+			raise ValueError("unknown decoder: %s" % decoder)
+		sentences = list(sentences)
+		# bucket the sentences by length so each batch steps through positions of similar sentences together
+		order = sorted([i for i in range(len(sentences)) if len(sentences[i]) > 0], key=lambda i: len(sentences[i]))
+		tag_predictions = [[] for sentence in sentences]
+		for start in range(0, len(order), batch_size):
+			batch = [sentences[i] for i in order[start:start+batch_size]]
+			scored = self.score_sentences(batch, to_lowercase=to_lowercase)
+			if decoder == "viterbi":
+				batch_tag_predictions = self.decode_viterbi(scored, [len(sentence) for sentence in batch])[0]
+			else:
+				batch_tag_predictions = self.decode_lookahead(scored, [len(sentence) for sentence in batch])
+			for i, sentence_tag_predictions in zip(order[start:start+batch_size], batch_tag_predictions):
+				tag_predictions[i] = sentence_tag_predictions
+		return tag_predictions
+
+	def get_tag_names(self, scored, tag_indices, sentence_lengths): # converts the chosen candidate index of every position to the tags of each sentence
+		tags = scored["candidate_tags"][scored["candidate_offsets"][:-1]+tag_indices].tolist()
+		tag_names = self.tags+[""] # tag id -1 is no tag
+		tag_predictions = []
+		start = 0
+		for sentence_length in sentence_lengths:
+			tag_predictions.append([tag_names[tag] for tag in tags[start:start+sentence_length]])
+			start += sentence_length
+		return tag_predictions
+
+	def decode_lookahead(self, scored, sentence_lengths):
+		# score each entry with its best continuation over the next two positions
+		scores = self.add_lookahead(scored, self.add_lookahead(scored, scored["log_likelihoods"]))
+		log_likelihoods = scored["log_likelihoods"]
+		sentence_lengths = np.array(sentence_lengths, dtype=np.int64)
+		sentence_starts = np.concatenate(([0], np.cumsum(sentence_lengths)))[:-1]
+		tag_indices = np.zeros(len(scored["candidate_counts"]), dtype=np.int64) # the chosen candidate index of every position
+		prev_tag_indices = np.zeros(len(sentence_lengths), dtype=np.int64)
+		two_prev_tag_indices = np.zeros(len(sentence_lengths), dtype=np.int64)
+		for i in range(int(sentence_lengths.max()) if len(sentence_lengths) > 0 else 0):
+			# step every sentence still running forward by one position
+			active = np.flatnonzero(sentence_lengths > i)
+			positions = sentence_starts[active]+i
+			candidate_counts = scored["candidate_counts"][positions]
+			group_indices = two_prev_tag_indices[active]*scored["prev_counts"][positions]+prev_tag_indices[active]
+			columns = np.arange(candidate_counts.max())
+			is_column = columns < candidate_counts[:, None]
+			entries = np.where(is_column, (scored["entry_offsets"][positions]+group_indices*candidate_counts)[:, None]+columns, 0)
+			is_considered = is_column & (scored["is_fallback"][scored["group_offsets"][positions]+group_indices][:, None] | np.isfinite(log_likelihoods[entries])) # zero likelihood tags are skipped unless every tag was zero
+			row_scores = scores[entries]
+			best_scores = np.where(is_considered, row_scores, -np.inf).max(axis=1)
+			is_best = is_considered & (row_scores == best_scores[:, None])
+			chosen = len(columns)-1-np.argmax(is_best[:, ::-1], axis=1) # ties go to the last candidate
+			tag_indices[positions] = chosen
+			two_prev_tag_indices[active] = prev_tag_indices[active]
+			prev_tag_indices[active] = chosen
+		return self.get_tag_names(scored, tag_indices, sentence_lengths.tolist())
+
+	def decode_viterbi(self, scored, sentence_lengths):
+		# each state is a (previous tag, tag) pair of a position, laid out like the groups of the next position
+		candidate_counts = scored["candidate_counts"]
+		prev_counts = scored["prev_counts"]
+		state_offsets = np.concatenate(([0], np.cumsum(prev_counts*candidate_counts)))
+		state_scores = np.full(state_offsets[-1], -np.inf) # the best log score of reaching each state
+		back_pointers = np.zeros(state_offsets[-1], dtype=np.int64) # the best two previous tag index of each state
+		entry_offsets = scored["entry_offsets"]
+		sentence_lengths = np.array(sentence_lengths, dtype=np.int64)
+		sentence_starts = np.concatenate(([0], np.cumsum(sentence_lengths)))[:-1]
+		max_length = int(sentence_lengths.max()) if len(sentence_lengths) > 0 else 0
+		for i in range(max_length):
+			active = np.flatnonzero(sentence_lengths > i)
+			positions = sentence_starts[active]+i
+			entry_counts = entry_offsets[positions+1]-entry_offsets[positions]
+			entry_positions = np.repeat(positions, entry_counts)
+			entries = np.arange(entry_counts.sum())-np.repeat(np.cumsum(entry_counts)-entry_counts, entry_counts)+entry_offsets[entry_positions]
+			group_indices = scored["entry_groups"][entries]-scored["group_offsets"][entry_positions]
+			prev_scores = 0.0
+			if i > 0:
+				prev_scores = state_scores[state_offsets[entry_positions-1]+group_indices]
+			next_scores = prev_scores+scored["log_likelihoods"][entries]
+			states = state_offsets[entry_positions]+scored["prev_tag_indices"][entries]*candidate_counts[entry_positions]+scored["tag_indices"][entries]
+			np.maximum.at(state_scores, states, next_scores)
+			# the first two previous tag reaching the best score of a state wins ties
+			is_best = next_scores == state_scores[states]
+			back_pointers[states] = np.iinfo(np.int64).max
+			np.minimum.at(back_pointers, states[is_best], (group_indices // prev_counts[entry_positions])[is_best])
+		# find the first best final state of each sentence
+		last_positions = sentence_starts+sentence_lengths-1
+		state_counts = state_offsets[last_positions+1]-state_offsets[last_positions]
+		final_states = np.arange(state_counts.sum())-np.repeat(np.cumsum(state_counts)-state_counts, state_counts)+np.repeat(state_offsets[last_positions], state_counts)
+		final_scores = state_scores[final_states]
+		final_starts = np.cumsum(state_counts)-state_counts
+		best_scores = np.maximum.reduceat(final_scores, final_starts) if len(final_scores) > 0 else final_scores
+		is_best = final_scores == np.repeat(best_scores, state_counts)
+		current_states = np.minimum.reduceat(np.where(is_best, final_states, np.iinfo(np.int64).max), final_starts) if len(final_scores) > 0 else final_states
+		# trace back from the best final states
+		tag_indices = np.zeros(len(candidate_counts), dtype=np.int64)
+		for i in range(max_length-1, -1, -1):
+			active = np.flatnonzero(sentence_lengths > i)
+			positions = sentence_starts[active]+i
+			local_states = current_states[active]-state_offsets[positions]
+			prev_tag_indices = local_states // candidate_counts[positions]
+			tag_indices[positions] = local_states % candidate_counts[positions]
+			if i > 0:
+				current_states[active] = state_offsets[positions-1]+back_pointers[current_states[active]]*prev_counts[positions]+prev_tag_indices
+		return self.get_tag_names(scored, tag_indices, sentence_lengths.tolist()), best_scores.tolist()
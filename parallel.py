@@ -0,0 +1,149 @@
+import collections
+import gc
+import multiprocessing
+import os
+import mm
+import stream
+
+DEFAULT_SHARD_SIZE = 100000 # the default number of lines in each shard of training data
+TASKS_PER_PROCESS = 2 # the number of tasks sent ahead to each worker process, so an input larger than memory is never read further ahead than that
+
+worker_model = None # the model of a worker process, inherited from the parent through fork or sent once when the worker starts
+
+def init_worker(model):
+	global worker_model
+	worker_model = model
+
+def tag_chunk(chunk):
+	sentences, to_lowercase, options = chunk
+	return tag_sentences(worker_model, sentences, to_lowercase, options)
+
+def tag_sentences(model, sentences, to_lowercase, options): # tags the sentences as one batch when the model can
+	if hasattr(model, "get_pos_tags_batch"):
+		return model.get_pos_tags_batch(sentences, to_lowercase=to_lowercase, **options)
+	return [model.get_pos_tags(sentence, to_lowercase=to_lowercase, **options) for sentence in sentences]
+
+def call_worker_model(task):
+	name, args = task
+	return getattr(worker_model, name)(*args)
+
+def get_context(): # fork where there is fork, so workers share the tables of the parent copy-on-write, and the same start method for every pool
+	if "fork" in multiprocessing.get_all_start_methods():
+		return multiprocessing.get_context("fork")
+	return multiprocessing.get_context()
+
+def start_pool(model, processes): # starts a pool of worker processes that all share the model
+	context = get_context()
+	if context.get_start_method() == "fork":
+		gc.freeze() # keep the garbage collector from touching, and so copying, the pages of the shared model
+	pool = context.Pool(processes, initializer=init_worker, initargs=(model,))
+	if context.get_start_method() == "fork":
+		gc.unfreeze()
+	return pool
+
+def map_model(model, name, tasks, processes=None): # calls a method of the model with the arguments of each task in worker processes, yielding the results as they finish
+	with start_pool(model, processes) as pool:
+		for result in pool.imap_unordered(call_worker_model, [(name, args) for args in tasks], chunksize=1): # one task at a time, so they start in the given order
+			yield result
+
+def count_shard(shard):
+	lines, to_lowercase = shard
+	model = mm.MM(model_path=None)
+	model.set_counts(lines, to_lowercase=to_lowercase)
+	return model
+
+def get_shards(data, shard_size, to_lowercase): # splits the data into shards of at least shard_size lines, only between sentences
+	lines = []
+	for line in data:
+		lines.append(line)
+		if len(lines) >= shard_size and not stream.is_token_line(line):
+			yield (lines, to_lowercase)
+			lines = []
+	if len(lines) > 0:
+		yield (lines, to_lowercase)
+
+# development function
+def train_mm(data, minimum=mm.MM.DEFAULT_MIN_TOKEN_OCCURRENCES, to_lowercase=mm.MM.DEFAULT_TO_LOWERCASE, processes=None, shard_size=DEFAULT_SHARD_SIZE):
+	# counts shards of the data in separate processes, merges the counts in order and only then prunes, giving the same model as MM.set_model
+	if processes is None:
+		processes = os.cpu_count() or 1
+	model = mm.MM(model_path=None)
+	with get_context().Pool(processes) as pool:
+		results = collections.deque() # the shards sent to the workers and not yet merged, in order
+		for shard in get_shards(data, shard_size, to_lowercase):
+			results.append(pool.apply_async(count_shard, (shard,)))
+			if len(results) >= processes*TASKS_PER_PROCESS:
+				model.merge_counts(results.popleft().get())
+		while len(results) > 0:
+			model.merge_counts(results.popleft().get())
+	model.prune(minimum)
+	return model
+
+class ParallelTagger:
+
+	DEFAULT_CHUNK_SIZE = 256 # the default number of sentences sent to a worker process at a time
+
+	def __init__(self, model, processes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+		self.model = model # the MM or MEMM shared by all worker processes
+		self.processes = processes
+		if self.processes is None:
+			self.processes = os.cpu_count() or 1
+		self.chunk_size = chunk_size
+		self.pool = None
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def __getattr__(self, name): # everything else comes from the wrapped model, so the tagger can stand in for it
+		if name == "model":
+			raise AttributeError(name)
+		return getattr(self.model, name)
+
+	def start(self):
+		if self.pool is not None:
+			return
+		if hasattr(self.model, "compile") and self.model.compiled_model is None:
+			self.model.compile() # compile once in the parent so every worker shares the same arrays
+		self.pool = start_pool(self.model, self.processes)
+
+	def close(self):
+		if self.pool is not None:
+			self.pool.close()
+			self.pool.join()
+			self.pool = None
+
+	def get_pos_tags(self, sentence, to_lowercase=None, **options):
+		if to_lowercase is None:
+			to_lowercase = self.model.DEFAULT_TO_LOWERCASE
+		return self.model.get_pos_tags(sentence, to_lowercase=to_lowercase, **options)
+
+	def get_pos_tags_batch(self, sentences, to_lowercase=None, **options):
+		return list(self.iter_pos_tags(sentences, to_lowercase=to_lowercase, **options))
+
+	def iter_pos_tags(self, sentences, to_lowercase=None, **options): # yields the tags of each sentence in order as the workers finish them
+		if to_lowercase is None:
+			to_lowercase = self.model.DEFAULT_TO_LOWERCASE
+		self.start()
+		results = collections.deque() # the chunks sent to the workers and not yet yielded, in order
+		for chunk in self.get_chunks(sentences, to_lowercase, options):
+			results.append(self.pool.apply_async(tag_chunk, (chunk,)))
+			if len(results) >= self.processes*TASKS_PER_PROCESS:
+				for tag_predictions in results.popleft().get():
+					yield tag_predictions
+		while len(results) > 0:
+			for tag_predictions in results.popleft().get():
+				yield tag_predictions
+
+	def get_chunks(self, sentences, to_lowercase, options):
+		chunk = []
+		for sentence in sentences:
+			chunk.append(sentence)
+			if len(chunk) >= self.chunk_size:
+				yield (chunk, to_lowercase, options)
+				chunk = []
+		if len(chunk) > 0:
+			yield (chunk, to_lowercase, options)
@@ -0,0 +1,54 @@
+import collections
+import sys
+
+def is_token_line(line): # a line of tagged data holding a token and its tag, every other line ending a sentence
+	return "\t" in line and len(line) > 2
+
+def read_sentences(lines, tagged=None):
+	# yields the columns of the lines of each sentence as soon as the line ending it is read. tagged data is split into
+	# sentences like training data is, by is_token_line, and untagged data has a token on every line that is not blank.
+	# by default the data is tagged if the first line that is not blank has a tab
+	rows = []
+	for line in lines:
+		if tagged is None and len(line.strip()) > 0:
+			tagged = "\t" in line
+		if is_token_line(line) if tagged else len(line.strip()) > 0:
+			rows.append(line.rstrip("\r\n").split("\t"))
+		elif len(rows) > 0:
+			yield rows
+			rows = [] # reset sentence
+	if len(rows) > 0: # handle last sentence if the input does not end in a blank line
+		yield rows
+
+def tag_sentences(model, sentences, to_lowercase=None, **options): # yields the rows of each sentence with its predicted tags, in order
+	if to_lowercase is None:
+		to_lowercase = model.DEFAULT_TO_LOWERCASE
+	if hasattr(model, "iter_pos_tags"): # a parallel tagger, which reads only a few chunks of sentences ahead of the tags it yields
+		pending_rows = collections.deque() # the rows of the sentences read but not yet tagged
+		for tag_predictions in model.iter_pos_tags(get_tokens(sentences, pending_rows), to_lowercase=to_lowercase, **options):
+			yield pending_rows.popleft(), tag_predictions
+		return
+	for rows in sentences:
+		yield rows, model.get_pos_tags([columns[0].strip() for columns in rows], to_lowercase=to_lowercase, **options)
+
+def get_tokens(sentences, pending_rows): # yields the tokens of each sentence, keeping its rows until its tags come back
+	for rows in sentences:
+		pending_rows.append(rows)
+		yield [columns[0].strip() for columns in rows]
+
+def tag_stream(model, lines, to_lowercase=None, tagged=None, **options):
+	# yields the (token, tag) pairs of each sentence of lines with a token in their first column, such as a file, sys.stdin
+	# or any other iterator of lines, holding only the sentence being tagged in memory
+	for rows, tags in tag_sentences(model, read_sentences(lines, tagged=tagged), to_lowercase=to_lowercase, **options):
+		yield [(columns[0].strip(), tag) for columns, tag in zip(rows, tags)]
+
+def write_tagged(model, lines, output=None, to_lowercase=None, tagged=None, **options):
+	# writes every line with its predicted tag added as a last column, and a blank line after each sentence, so an untagged
+	# input becomes training data and a tagged input has the actual and predicted tags side by side
+	if output is None:
+		output = sys.stdout
+	for rows, tags in tag_sentences(model, read_sentences(lines, tagged=tagged), to_lowercase=to_lowercase, **options):
+		for columns, tag in zip(rows, tags):
+			output.write("%s\t%s\n" % ("\t".join(columns), tag))
+		output.write("\n")
+		output.flush() # a reader at the other end of a pipe gets each sentence as soon as it is tagged
@@ -0,0 +1,113 @@
+import io
+import itertools
+import random
+import time
+import evaluation
+import memm
+import mm
+import parallel
+import stream
+
+DEFAULT_FOLDS = 5 # the default number of folds the sentences of the data are split into
+DEFAULT_SEED = 0 # the default seed of the random number generator picking the configurations of a random search
+
+PARAMETERS = {"mm": ["minimum", "to_lowercase"], "memm": ["minimum_for_token", "minimum_for_feature", "to_lowercase", "max_epochs", "averaged", "held_out_fraction"]} # the parameters of set_model each kind of model can be swept over
+MINIMUM_PARAMETERS = {"mm": "minimum", "memm": "minimum_for_token"} # the minimum number of token occurrences of each kind of model, which must be at least 2 as when tuning
+
+class Sweep: # trains and evaluates configurations of a model on every fold of the data, holding the folds and the shared counts the worker processes inherit
+
+	def __init__(self, kind, data, folds=DEFAULT_FOLDS):
+		if kind not in PARAMETERS:
+			raise ValueError("unknown kind of model: %s" % kind)
+		if folds < 2:
+			raise ValueError("the data must be split into at least 2 folds")
+		self.kind = kind
+		self.folds = [[] for _ in range(folds)] # the lines of the sentences of each fold, sentence i being in fold i % folds
+		for i, sentence_lines in enumerate(get_sentence_lines(data)):
+			self.folds[i % folds].extend(sentence_lines)
+		self.counts = {} # the unpruned counts of the training data of each fold and lowercasing, with the seconds taken to count them
+
+	def get_training_lines(self, fold): # every line but those of the fold
+		return itertools.chain.from_iterable([self.folds[i] for i in range(len(self.folds)) if i != fold])
+
+	def get_configurations(self, space, samples=None, seed=DEFAULT_SEED): # every configuration of the grid of values of the space, or a random sample of them
+		for parameter in space:
+			if parameter not in PARAMETERS[self.kind]:
+				raise ValueError("unknown parameter of the %s: %s (the parameters are %s)" % (self.kind.upper(), parameter, ", ".join(PARAMETERS[self.kind])))
+		for minimum in space.get(MINIMUM_PARAMETERS[self.kind], []):
+			if minimum < 2:
+				raise ValueError("the minimum number of token occurrences to be considered by the model must be at least 2")
+		parameters = sorted(space)
+		configurations = [dict(zip(parameters, values)) for values in itertools.product(*[space[parameter] for parameter in parameters])]
+		if samples is not None and samples < len(configurations):
+			configurations = random.Random(seed).sample(configurations, samples)
+		return configurations
+
+	def count_fold(self, fold, to_lowercase):
+		start = time.perf_counter()
+		counts = mm.MM(model_path=None)
+		counts.set_counts(self.get_training_lines(fold), to_lowercase=to_lowercase)
+		return fold, to_lowercase, counts, time.perf_counter()-start
+
+	def evaluate(self, index, configuration, fold): # trains the configuration on every other fold and scores it on the fold
+		to_lowercase = configuration.get("to_lowercase", mm.MM.DEFAULT_TO_LOWERCASE if self.kind == "mm" else memm.MEMM.DEFAULT_TO_LOWERCASE)
+		start = time.perf_counter()
+		if self.kind == "mm": # the counts are shared by every minimum, so only the pruning is repeated
+			counts, train_seconds = self.counts[(fold, to_lowercase)]
+			model = mm.MM(model_path=None)
+			model.merge_counts(counts)
+			model.prune(configuration.get("minimum", mm.MM.DEFAULT_MIN_TOKEN_OCCURRENCES))
+		else:
+			train_seconds = 0.0
+			model = memm.MEMM(model_path=None)
+			model.set_model(io.StringIO("".join(self.get_training_lines(fold))), **configuration)
+		train_seconds += time.perf_counter()-start
+		start = time.perf_counter()
+		stats = evaluation.evaluate(model, self.folds[fold], to_lowercase=to_lowercase).get_stats()
+		tag_seconds = time.perf_counter()-start
+		tokens = stats["overall"]["correct"]+stats["overall"]["incorrect"]
+		return index, {"fold": fold, "tokens": tokens, "accuracy": stats["overall"]["accuracy"], "known_accuracy": stats["known"]["accuracy"], "unknown_accuracy": stats["unknown"]["accuracy"], "train_seconds": train_seconds, "tag_seconds": tag_seconds}
+
+	def run(self, space, processes=None, samples=None, seed=DEFAULT_SEED): # returns the leaderboard of the configurations, the most accurate first
+		configurations = self.get_configurations(space, samples=samples, seed=seed)
+		if self.kind == "mm":
+			# count the training data of each fold once for each lowercasing, before the workers evaluating the configurations are forked
+			count_tasks = sorted(set([(fold, configuration.get("to_lowercase", mm.MM.DEFAULT_TO_LOWERCASE)) for configuration in configurations for fold in range(len(self.folds))]))
+			for fold, to_lowercase, counts, seconds in parallel.map_model(self, "count_fold", count_tasks, processes=processes):
+				self.counts[(fold, to_lowercase)] = (counts, seconds)
+		tasks = [(i, configuration, fold) for i, configuration in enumerate(configurations) for fold in range(len(self.folds))]
+		fold_results = [[] for _ in configurations]
+		for i, fold_result in parallel.map_model(self, "evaluate", tasks, processes=processes):
+			fold_results[i].append(fold_result)
+		self.counts = {}
+		results = []
+		for configuration, configuration_fold_results in zip(configurations, fold_results):
+			configuration_fold_results.sort(key=lambda fold_result: fold_result["fold"])
+			results.append({"configuration": configuration, "accuracy": get_mean(configuration_fold_results, "accuracy"), "known_accuracy": get_mean(configuration_fold_results, "known_accuracy"), "unknown_accuracy": get_mean(configuration_fold_results, "unknown_accuracy"), "train_seconds": get_mean(configuration_fold_results, "train_seconds"), "tokens_per_second": get_tokens_per_second(configuration_fold_results), "folds": configuration_fold_results})
+		results.sort(key=lambda result: -1.0 if result["accuracy"] is None else result["accuracy"], reverse=True)
+		return {"kind": self.kind, "folds": len(self.folds), "space": space, "samples": samples, "seed": seed, "results": results}
+
+def get_sentence_lines(data): # yields the lines of each sentence of tagged data, ending in a blank line
+	lines = []
+	for line in data:
+		if stream.is_token_line(line):
+			lines.append("%s\n" % line.rstrip("\r\n"))
+		elif len(lines) > 0:
+			lines.append("\n")
+			yield lines
+			lines = []
+	if len(lines) > 0: # handle last sentence if data file does not end in new line
+		lines.append("\n")
+		yield lines
+
+def get_mean(fold_results, name): # the mean of a result over the folds that have it
+	values = [fold_result[name] for fold_result in fold_results if fold_result[name] is not None]
+	if len(values) == 0:
+		return None
+	return sum(values)/len(values)
+
+def get_tokens_per_second(fold_results):
+	seconds = sum([fold_result["tag_seconds"] for fold_result in fold_results])
+	if seconds <= 0:
+		return None
+	return sum([fold_result["tokens"] for fold_result in fold_results])/seconds